@@ -6,16 +6,30 @@ import connexion
 from dotenv import load_dotenv
 from flask import Flask
 from flask_cors import CORS
+from utils.cache import ResponseCache, get_cache_backend
 from utils.cli import is_true
-from utils.db import Database
-from utils.encoders import AlchemyEncoder
+from utils.db import HUC8_PATH, Database
+from utils.instrumentation import Instrumentation
+from utils.scenarios import ScenarioCalculator
 
 # Load environment variables from .env
 load_dotenv()
 
+# Paths of the responses cached by the API, relative to the API context (see `ResponseCache`)
+CACHED_PATHS = (
+    "/practices",
+    "/practices/active_years",
+    "/huc8",
+    "/states",
+    "/huc8/geometries",
+    "/huc8/tiles/",
+)
+
 
-def get_db(host: str, port: str, user: str, password: str, name: str) -> Database:
-    return Database(host, port, user, password, name)
+def get_db(
+    host: str, port: str, user: str, password: str, name: str, **options
+) -> Database:
+    return Database(host, port, user, password, name, **options)
 
 
 @click.group()
@@ -31,6 +45,39 @@ def get_db(host: str, port: str, user: str, password: str, name: str) -> Databas
 @click.option("--db-name", type=str, default="gltg_bmp", help="env variable: DB_NAME")
 @click.option("--db-user", type=str, default="postgres", help="env variable: DB_USER")
 @click.option("--db-password", type=str, default="", help="env variable: DB_PASSWORD")
+@click.option(
+    "--no-bulk-copy",
+    is_flag=True,
+    help="Write imported tables with INSERT statements instead of COPY. env variable: DB_BULK_COPY",
+)
+@click.option(
+    "--db-pool-size",
+    type=int,
+    default=5,
+    help="Number of connections kept open in the pool of each process. env variable: DB_POOL_SIZE",
+)
+@click.option(
+    "--db-max-overflow",
+    type=int,
+    default=10,
+    help="Number of connections opened above the pool size under load. env variable: DB_MAX_OVERFLOW",
+)
+@click.option(
+    "--db-pool-timeout",
+    type=float,
+    default=30,
+    help="Seconds to wait for a connection when the pool is exhausted. env variable: DB_POOL_TIMEOUT",
+)
+@click.option(
+    "--no-db-pool-pre-ping",
+    is_flag=True,
+    help="Don't test connections when they are taken from the pool. env variable: DB_POOL_PRE_PING",
+)
+@click.option(
+    "--profile-import",
+    is_flag=True,
+    help="Profile the imports with cProfile and write the stats to ./logs. env variable: IMPORT_PROFILE",
+)
 @click.pass_context
 def cli(
     ctx,
@@ -41,6 +88,12 @@ def cli(
     db_name: str,
     db_user: str,
     db_password: str,
+    no_bulk_copy: bool,
+    db_pool_size: int,
+    db_max_overflow: int,
+    db_pool_timeout: float,
+    no_db_pool_pre_ping: bool,
+    profile_import: bool,
 ):
     """All parameters are determined first by their respective environment variable and then by their cli flag."""
     ctx.ensure_object(dict)
@@ -58,61 +111,187 @@ def cli(
         "name": os.getenv("DB_NAME", db_name),
         "user": os.getenv("DB_USER", db_user),
         "password": os.getenv("DB_PASSWORD", db_password),
+        "bulk_copy": is_true(os.getenv("DB_BULK_COPY", "True")) and not no_bulk_copy,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", db_pool_size)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", db_max_overflow)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", db_pool_timeout)),
+        "pool_pre_ping": is_true(os.getenv("DB_POOL_PRE_PING", "True"))
+        and not no_db_pool_pre_ping,
+        "profile_imports": is_true(os.getenv("IMPORT_PROFILE", "False"))
+        or profile_import,
     }
 
 
 @cli.command()
+@click.option(
+    "--huc8-path",
+    type=str,
+    default=HUC8_PATH,
+    help="Dataset with the WBDHU8 layer of the HUC8 boundaries. env variable: HUC8_PATH",
+)
 @click.pass_context
-def prepare_db(ctx):
+def prepare_db(ctx, huc8_path: str):
     """Import states, HUC8s, and assumptions into the database"""
     db = get_db(**ctx.obj["DATABASE"])
-    db.prepare()
+    db.prepare(os.getenv("HUC8_PATH", huc8_path))
 
 
 @cli.command()
-@click.option(
-    "--api-context",
-    type=str,
-    default="/bmp-api",
-    help="env variable: API_CONTEXT",
-)
-@click.option(
-    "--port",
-    type=int,
-    default=8000,
-    help="env variable: API_PORT",
-)
 @click.pass_context
-def run(ctx, api_context, port):
-    """
-    Start API Server
-    All parameters are determined first by their respective environment variable and then by their cli flag.
-    """
+def upgrade_db(ctx):
+    """Create the tables that are missing in a database imported by an older version, e.g. the rollups"""
+    db = get_db(**ctx.obj["DATABASE"])
+    db.upgrade()
+
+
+def server_options(command):
+    """The options shared by the commands that start the API server."""
+    options = [
+        click.option(
+            "--api-context",
+            type=str,
+            default="/bmp-api",
+            help="env variable: API_CONTEXT",
+        ),
+        click.option(
+            "--port",
+            type=int,
+            default=8000,
+            help="env variable: API_PORT",
+        ),
+        click.option(
+            "--cache-url",
+            type=str,
+            default="memory",
+            help="Where to cache responses: `memory` for a cache in each process or the URL of a redis server. "
+            "env variable: API_CACHE_URL",
+        ),
+        click.option(
+            "--cache-size",
+            type=int,
+            default=64,
+            help="Maximum size in MB of the memory cache. Responses are not cached if it's 0. "
+            "env variable: API_CACHE_SIZE",
+        ),
+        click.option(
+            "--slow-query-ms",
+            type=float,
+            default=0,
+            help="Milliseconds above which the plans of the queries are captured with EXPLAIN ANALYZE, "
+            "0 to disable it. env variable: API_SLOW_QUERY_MS",
+        ),
+        click.option(
+            "--metrics-token",
+            type=str,
+            default="",
+            help="Bearer token of the /metrics endpoints, which are disabled without it. "
+            "env variable: API_METRICS_TOKEN",
+        ),
+        # Only the queries of the API are cancelled, the imports of `prepare-db` can take longer
+        click.option(
+            "--db-statement-timeout",
+            type=int,
+            default=0,
+            help="Milliseconds after which a query is cancelled, 0 for no timeout. "
+            "env variable: DB_STATEMENT_TIMEOUT",
+        ),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def create_app(
+    ctx,
+    api_context: str,
+    cache_url: str,
+    cache_size: int,
+    slow_query_ms: float,
+    metrics_token: str,
+    db_statement_timeout: int,
+) -> connexion.FlaskApp:
     app = connexion.FlaskApp(
         __name__,
         specification_dir="swagger",
         resolver=connexion.resolver.RestyResolver("handlers"),
     )
+    api_context = os.getenv("API_CONTEXT", api_context)
     app.add_api(
         "v1.0.yaml",
-        base_path=os.getenv("API_CONTEXT", api_context),
+        base_path=api_context,
         strict_validation=True,
         options={"swagger_url": "/docs"},
     )
 
     flask_app: Flask = app.app
     CORS(flask_app)
-    flask_app.json_encoder = AlchemyEncoder
 
-    db = get_db(**ctx.obj["DATABASE"])
+    db = get_db(
+        **ctx.obj["DATABASE"],
+        statement_timeout=int(os.getenv("DB_STATEMENT_TIMEOUT", db_statement_timeout)),
+    )
     flask_app.db_session = db.get_session()
 
+    # Initialized before the response cache, so the cached responses are measured too
+    instrumentation = Instrumentation(
+        float(os.getenv("API_SLOW_QUERY_MS", slow_query_ms)) / 1000
+    )
+    instrumentation.init_app(flask_app)
+    instrumentation.instrument(db.engine)
+    instrumentation.instrument(db.count_engine)
+    flask_app.instrumentation = instrumentation
+    # The metrics show the SQL, the query strings and the plans of the requests, so they aren't public
+    flask_app.metrics_token = os.getenv("API_METRICS_TOKEN", metrics_token)
+
+    scenarios = ScenarioCalculator(db.get_practice_reductions, db.get_data_version)
+    scenarios.preload()
+    flask_app.scenarios = scenarios
+
+    cache_size = int(os.getenv("API_CACHE_SIZE", cache_size))
+    if cache_size > 0:
+        ResponseCache(
+            get_cache_backend(
+                os.getenv("API_CACHE_URL", cache_url), cache_size * 1024 * 1024
+            ),
+            db.get_data_version,
+            CACHED_PATHS,
+        ).init_app(flask_app, api_context)
+
     @flask_app.teardown_appcontext
-    def shutdown_session(exception=None):
-        flask_app.db_session = None
-        db.shutdown()
+    def remove_session(exception=None):
+        # Returns the connection of the request to the pool, which is kept open for the next requests
+        db.remove_session()
 
     flask_app.env = "development" if ctx.obj["DEBUG"] else "production"
+    return app
+
+
+@cli.command()
+@server_options
+@click.pass_context
+def run(
+    ctx,
+    api_context,
+    port,
+    cache_url,
+    cache_size,
+    slow_query_ms,
+    metrics_token,
+    db_statement_timeout,
+):
+    """
+    Start API Server
+    All parameters are determined first by their respective environment variable and then by their cli flag.
+    """
+    app = create_app(
+        ctx,
+        api_context,
+        cache_url,
+        cache_size,
+        slow_query_ms,
+        metrics_token,
+        db_statement_timeout,
+    )
     app.run(
         port=os.getenv("API_PORT", port),
         debug=ctx.obj["DEBUG"],
@@ -121,5 +300,123 @@ def run(ctx, api_context, port):
     )
 
 
+@cli.command()
+@server_options
+@click.option("--host", type=str, default="0.0.0.0", help="env variable: API_HOST")
+@click.option(
+    "--workers",
+    type=int,
+    default=2,
+    help="Number of worker processes. env variable: API_WORKERS",
+)
+@click.option(
+    "--worker-class",
+    type=click.Choice(["gthread", "gevent"]),
+    default="gthread",
+    help="`gthread` handles each request in a thread, `gevent` handles the requests of each worker in greenlets "
+    "that wait for the database concurrently. env variable: API_WORKER_CLASS",
+)
+@click.option(
+    "--threads",
+    type=int,
+    default=4,
+    help="Number of threads handling requests in each gthread worker. env variable: API_THREADS",
+)
+@click.option(
+    "--worker-connections",
+    type=int,
+    default=1000,
+    help="Maximum number of requests handled at the same time by each gevent worker. "
+    "env variable: API_WORKER_CONNECTIONS",
+)
+@click.option(
+    "--preload/--no-preload",
+    default=True,
+    help="Load the app before forking the workers. gevent workers always load the app after they start. "
+    "env variable: API_PRELOAD",
+)
+@click.option(
+    "--keep-alive",
+    type=int,
+    default=5,
+    help="Seconds to wait for the next request on a keep-alive connection. env variable: API_KEEP_ALIVE",
+)
+@click.option(
+    "--timeout",
+    type=int,
+    default=60,
+    help="Seconds after which a silent worker is restarted. env variable: API_TIMEOUT",
+)
+@click.option(
+    "--graceful-timeout",
+    type=int,
+    default=60,
+    help="Seconds that workers have to finish their requests when they are restarted or stopped. "
+    "env variable: API_GRACEFUL_TIMEOUT",
+)
+@click.pass_context
+def serve(
+    ctx,
+    api_context,
+    port,
+    cache_url,
+    cache_size,
+    slow_query_ms,
+    metrics_token,
+    db_statement_timeout,
+    host,
+    workers,
+    worker_class,
+    threads,
+    worker_connections,
+    preload,
+    keep_alive,
+    timeout,
+    graceful_timeout,
+):
+    """
+    Start API Server with gunicorn for production
+    All parameters are determined first by their respective environment variable and then by their cli flag.
+    Send SIGHUP to the main process to replace the workers without dropping the requests in progress.
+    """
+    # gunicorn only runs on Unix, so it's only imported by this command
+    from utils.server import GunicornServer, patch_psycopg
+
+    worker_class = os.getenv("API_WORKER_CLASS", worker_class)
+    options = {}
+    if worker_class == "gevent":
+        # The workers patch the standard library when they start, so the app is loaded after that,
+        # and psycopg waits for the database by yielding to the other greenlets
+        options = {"preload_app": False, "post_fork": patch_psycopg}
+    GunicornServer(
+        lambda: create_app(
+            ctx,
+            api_context,
+            cache_url,
+            cache_size,
+            slow_query_ms,
+            metrics_token,
+            db_statement_timeout,
+        ).app,
+        {
+            "bind": f"{os.getenv('API_HOST', host)}:{os.getenv('API_PORT', port)}",
+            "workers": int(os.getenv("API_WORKERS", workers)),
+            "worker_class": worker_class,
+            "threads": int(os.getenv("API_THREADS", threads)),
+            "worker_connections": int(
+                os.getenv("API_WORKER_CONNECTIONS", worker_connections)
+            ),
+            "preload_app": is_true(os.getenv("API_PRELOAD", str(preload))),
+            "keepalive": int(os.getenv("API_KEEP_ALIVE", keep_alive)),
+            "timeout": int(os.getenv("API_TIMEOUT", timeout)),
+            "graceful_timeout": int(
+                os.getenv("API_GRACEFUL_TIMEOUT", graceful_timeout)
+            ),
+            "loglevel": logging.getLevelName(logging.getLogger().level).lower(),
+            **options,
+        },
+    ).run()
+
+
 if __name__ == "__main__":
     cli()
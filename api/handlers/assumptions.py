@@ -1,6 +1,6 @@
-from flask import jsonify
 from sqlalchemy import JSON, BigInteger, Column, Text
 from utils import db, query
+from utils.serializers import jsonify
 
 
 class Assumption(db.Base):
@@ -48,9 +48,13 @@ class Assumption(db.Base):
     ancillary_benefits = Column(JSON)
 
 
-def get(assumption_id):
-    return jsonify(query.get(Assumption, assumption_id))
+def get(assumption_id, fields=()):
+    return jsonify(query.get(Assumption, assumption_id, fields=fields))
 
 
-def search(page, limit):
-    return jsonify(query.search(Assumption, page, limit))
+def search(page, limit, cursor=None, count="exact", fields=()):
+    return jsonify(
+        query.search(
+            Assumption, page, limit, fields=fields, cursor=cursor, count_mode=count
+        )
+    )
@@ -1,8 +1,12 @@
-from flask import jsonify
+from flask import Response
 from geoalchemy2 import Geometry
-from handlers.practices import Practice
-from sqlalchemy import Column, Float, Text
+from sqlalchemy import Column, Float, Text, text
 from utils import db, query
+from utils.db import HUC8_SIMPLIFICATIONS
+from utils.rollups import PRACTICES_BY_HUC8
+from utils.serializers import jsonify
+from utils.spatial import get_query_geometries
+from werkzeug.exceptions import NotFound
 
 
 class HUC8(db.Base):
@@ -18,23 +22,127 @@ class HUC8(db.Base):
     )
 
 
-def get(huc8_id):
-    return jsonify(query.get(HUC8, huc8_id))
+def get(huc8_id, fields=()):
+    return jsonify(
+        query.get(
+            HUC8,
+            huc8_id,
+            columns=PRACTICES_BY_HUC8.summary_columns(),
+            outer_joins=[
+                (PRACTICES_BY_HUC8.table, PRACTICES_BY_HUC8.table.c.huc_8 == HUC8.huc8)
+            ],
+            fields=fields,
+        )
+    )
+
+
+def get_simplification_zoom(zoom):
+    """:return: The maximum zoom level of the simplified HUC8 geometries used for a zoom level."""
+    for max_zoom, _ in HUC8_SIMPLIFICATIONS:
+        if zoom <= max_zoom:
+            return max_zoom
+    return HUC8_SIMPLIFICATIONS[-1][0]
 
 
-def search(page, limit):
-    available_huc8s = [
-        huc8
-        for (huc8,) in Practice.query.session.query(Practice.huc_8)
-        .group_by(Practice.huc_8)
-        .all()
-    ]
+def search(
+    page,
+    limit,
+    cursor=None,
+    count="exact",
+    fields=(),
+    bbox=None,
+    point=None,
+    intersects=None,
+):
+    """Returns the HUC8s that have practices, with the totals of their practices."""
+    query_geometries = get_query_geometries(bbox, point, intersects)
     return jsonify(
         query.search(
             model=HUC8,
             page=page,
             limit=limit,
-            query_filters_config=[("huc8", "in_", available_huc8s)],
-            columns=[HUC8.huc8, HUC8.name, HUC8.area_acres, HUC8.states],
+            query_filters_config=[
+                # Joins the HUC8s to the rollup of their practices, which only has the HUC8s with practices
+                ("huc8", "__eq__", PRACTICES_BY_HUC8.table.c.huc_8),
+                *[
+                    ("geometry", "ST_Intersects", query_geometry)
+                    for query_geometry in query_geometries
+                ],
+            ],
+            columns=[
+                HUC8.huc8,
+                HUC8.name,
+                HUC8.area_acres,
+                HUC8.states,
+                *PRACTICES_BY_HUC8.summary_columns(),
+            ],
+            fields=fields,
+            cursor=cursor,
+            count_mode=count,
         )
     )
+
+
+def geometries(zoom=4):
+    """Returns a GeoJSON feature collection of the available HUC8s with the geometries simplified for `zoom`."""
+    feature_collection = HUC8.query.session.execute(
+        text(
+            """
+            SELECT json_build_object(
+                'type', 'FeatureCollection',
+                'features', COALESCE(json_agg(ST_AsGeoJSON(features.*, 'geometry', 5)::json), '[]')
+            )::text
+            FROM (
+                SELECT
+                    huc8.huc8,
+                    huc8.name,
+                    huc8.areaacres AS area_acres,
+                    huc8.states,
+                    practices_by_huc8.row_count AS practice_count,
+                    huc8_simplified.geometry
+                FROM huc8_simplified
+                JOIN huc8 USING (huc8)
+                JOIN practices_by_huc8 ON practices_by_huc8.huc_8 = huc8.huc8
+                WHERE huc8_simplified.max_zoom = :max_zoom
+                ORDER BY huc8.huc8
+            ) AS features
+            """
+        ),
+        {"max_zoom": get_simplification_zoom(zoom)},
+    ).scalar()
+    return Response(feature_collection, mimetype="application/geo+json")
+
+
+def tile(z, x, y):
+    """Returns the Mapbox Vector Tile of the available HUC8s in the tile `z/x/y`."""
+    if x >= 2 ** z or y >= 2 ** z:
+        raise NotFound(f"Tile {z}/{x}/{y} does not exist")
+    mvt = HUC8.query.session.execute(
+        text(
+            """
+            WITH bounds AS (SELECT ST_TileEnvelope(:z, :x, :y) AS geometry)
+            SELECT ST_AsMVT(features.*, 'huc8')
+            FROM (
+                SELECT
+                    huc8.huc8,
+                    huc8.name,
+                    huc8.areaacres AS area_acres,
+                    practices_by_huc8.row_count AS practice_count,
+                    ST_AsMVTGeom(ST_Transform(huc8_simplified.geometry, 3857), bounds.geometry) AS geometry
+                FROM huc8_simplified
+                JOIN huc8 USING (huc8)
+                JOIN practices_by_huc8 ON practices_by_huc8.huc_8 = huc8.huc8
+                CROSS JOIN bounds
+                WHERE huc8_simplified.max_zoom = :max_zoom
+                  AND huc8_simplified.geometry && ST_Transform(bounds.geometry, 4326)
+            ) AS features
+            """
+        ),
+        {
+            "z": z,
+            "x": x,
+            "y": y,
+            "max_zoom": get_simplification_zoom(z),
+        },
+    ).scalar()
+    return Response(bytes(mvt or b""), mimetype="application/vnd.mapbox-vector-tile")
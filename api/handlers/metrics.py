@@ -0,0 +1,26 @@
+import hmac
+
+from flask import current_app, request
+from utils.serializers import jsonify
+from werkzeug.exceptions import NotFound, Unauthorized
+
+
+def check_token():
+    """The metrics are only returned with the `API_METRICS_TOKEN` bearer token, and they are disabled without it."""
+    token = current_app.metrics_token
+    if not token:
+        raise NotFound()
+    if not hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()
+    ):
+        raise Unauthorized("Invalid metrics token")
+
+
+def pool():
+    check_token()
+    return jsonify(current_app.db_session.get_bind().pool.metrics())
+
+
+def queries():
+    check_token()
+    return jsonify(current_app.instrumentation.metrics())
@@ -1,6 +1,24 @@
-from flask import jsonify
-from sqlalchemy import JSON, BigInteger, Column, Float, Text, and_, or_
-from utils import db, query
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Float,
+    Text,
+    and_,
+    column,
+    func,
+    or_,
+    select,
+    table,
+)
+from sqlalchemy.dialects.postgresql import JSONB, array
+from sqlalchemy.sql.elements import ColumnElement
+from utils import db, query, serializers
+from utils.export import export as export_query
+from utils.serializers import jsonify, ndjson
+from utils.spatial import get_query_geometries
+from werkzeug.exceptions import BadRequest
 
 
 class Practice(db.Base):
@@ -25,7 +43,7 @@ class Practice(db.Base):
     category = Column(Text)
     wq_benefits = Column(Text)
     area_treated = Column(Float(53))
-    ancillary_benefits = Column(JSON)
+    ancillary_benefits = Column(JSONB)
     p_reduction_fraction = Column(Float(53))
     n_reduction_fraction = Column(Float(53))
     p_reduction_percentage_statewide = Column(Float(53))
@@ -34,20 +52,26 @@ class Practice(db.Base):
     n_reduction_gom_lbs = Column(Float(53))
 
 
-def get(practice_id):
-    return jsonify(query.get(Practice, practice_id))
+# The columns summed over the practices active each year
+ACTIVE_YEAR_MEASURES = ("area_treated", "p_reduction_gom_lbs", "n_reduction_gom_lbs")
 
+# The reduction columns of the practices by nutrient type and value type
+REDUCTION_COLUMNS = {
+    (nutrient_type, value_type): f"{prefix}_reduction_{value_type}"
+    for (nutrient_type, prefix) in (("phosphorus", "p"), ("nitrogen", "n"))
+    for value_type in ("fraction", "percentage_statewide", "gom_lbs")
+}
 
-def search(
-    page,
-    limit,
-    group_by=(),
-    aggregates=(),
-    partitions=(),
-    partition_size=0,
-    order_by=(),
-    **filters
-):
+# The columns of the HUC8s table used by the spatial filters
+HUC8_TABLE = table("huc8", column("huc8"), column("geometry"))
+
+
+def get(practice_id, fields=()):
+    return jsonify(query.get(Practice, practice_id, fields=fields))
+
+
+def get_query_filters_config(filters):
+    """:return: The query filters config of the filter parameters of the practices endpoints."""
     query_filters_config = {
         "huc_8": ("huc_8", "in_", filters.get("huc_8")),
         "state": ("state", "in_", filters.get("state")),
@@ -78,8 +102,8 @@ def search(
         "wq_benefits": ("wq_benefits", "__eq__", filters.get("wq_benefits")),
         "ancillary_benefits": (
             "ancillary_benefits",
-            "__in__",
-            filters.get("ancillary_benefits"),
+            "has_any",
+            array(filters.get("ancillary_benefits") or ()),
         ),
         "min_area_treated": (
             and_,
@@ -96,19 +120,142 @@ def search(
             ),
         ),
     }
+    query_filters_config = [
+        v for k, v in query_filters_config.items() if filters.get(k) is not None
+    ]
 
-    return jsonify(
-        query.search(
-            model=Practice,
-            page=page,
-            limit=limit,
-            query_filters_config=[
-                v for k, v in query_filters_config.items() if filters.get(k) is not None
-            ],
-            group_by=group_by,
-            aggregates=aggregates,
-            partitions=partitions,
-            partition_size=partition_size,
-            order_by=order_by,
+    # Practices are located by their HUC8
+    query_geometries = get_query_geometries(
+        filters.get("bbox"), filters.get("point"), filters.get("intersects")
+    )
+    if query_geometries:
+        query_filters_config.append(
+            (
+                "huc_8",
+                "in_",
+                select(HUC8_TABLE.c.huc8).where(
+                    and_(
+                        *[
+                            func.ST_Intersects(HUC8_TABLE.c.geometry, query_geometry)
+                            for query_geometry in query_geometries
+                        ]
+                    )
+                ),
+            )
         )
+
+    return query_filters_config
+
+
+def project_reductions(
+    nutrient_type: Optional[str],
+    value_type: Optional[str],
+    group_by: Iterable[str] = (),
+    aggregates: Iterable[str] = (),
+) -> Tuple[List[ColumnElement], List[str]]:
+    """
+    Selects the reduction columns of a nutrient type and value type (of all of them for a missing type),
+    so the database doesn't read and the API doesn't serialize the other ones.
+
+    :return: The columns of the practices without the other reduction columns, unless the results are grouped
+             or aggregated, and the aggregates. Grouped results without aggregates get the sums of the selected
+             reduction columns.
+    """
+    aggregates = list(aggregates)
+    if nutrient_type is None and value_type is None:
+        return [], aggregates
+
+    selected = [
+        column
+        for (nutrient, value), column in REDUCTION_COLUMNS.items()
+        if nutrient_type in (None, nutrient) and value_type in (None, value)
+    ]
+    excluded = set(REDUCTION_COLUMNS.values()) - set(selected)
+
+    if not group_by and not aggregates:
+        return [
+            column
+            for column in serializers.model_columns(Practice)
+            if column.key not in excluded
+        ], aggregates
+
+    for aggregate in aggregates:
+        if aggregate.split("-")[0] in excluded:
+            raise BadRequest(
+                f"Invalid aggregate {aggregate}: it's not a value of the nutrient_type and value_type"
+            )
+    if not aggregates:
+        aggregates = [f"{column}-sum" for column in selected]
+    return [], aggregates
+
+
+def search(
+    page,
+    limit,
+    group_by=(),
+    aggregates=(),
+    partitions=(),
+    partition_size=0,
+    order_by=(),
+    cursor=None,
+    count="exact",
+    format="json",
+    fields=(),
+    nutrient_type=None,
+    value_type=None,
+    **filters,
+):
+    (columns, aggregates) = project_reductions(
+        nutrient_type, value_type, group_by, aggregates
+    )
+    search_args = dict(
+        model=Practice,
+        page=page,
+        limit=limit,
+        query_filters_config=get_query_filters_config(filters),
+        columns=columns,
+        fields=fields,
+        group_by=group_by,
+        aggregates=aggregates,
+        partitions=partitions,
+        partition_size=partition_size,
+        order_by=order_by,
+    )
+    if format == "ndjson":
+        return ndjson(query.stream(**search_args))
+
+    return jsonify(query.search(**search_args, cursor=cursor, count_mode=count))
+
+
+def export(
+    format="parquet",
+    order_by=(),
+    fields=(),
+    nutrient_type=None,
+    value_type=None,
+    **filters,
+):
+    (columns, _) = project_reductions(nutrient_type, value_type)
+    (practices_query, columns, _) = query.search_query(
+        model=Practice,
+        query_filters_config=get_query_filters_config(filters),
+        columns=columns,
+        fields=fields,
+        order_by=order_by,
+    )
+    return export_query(practices_query, columns, format, "practices")
+
+
+def active_years(from_year=None, to_year=None, **filters):
+    """Returns the number of practices active each year, from their applied date to their sunset, and their totals."""
+    return jsonify(
+        {
+            "results": query.active_years(
+                Practice,
+                get_query_filters_config(filters),
+                ACTIVE_YEAR_MEASURES,
+                from_year,
+                to_year,
+            )
+        }
     )
@@ -0,0 +1,6 @@
+from flask import current_app
+from utils.serializers import jsonify
+
+
+def evaluate(body):
+    return jsonify(current_app.scenarios.evaluate(body["practices"]))
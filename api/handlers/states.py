@@ -1,7 +1,7 @@
-from flask import jsonify
-from handlers.practices import Practice
 from sqlalchemy import Column, Float, Text
-from utils import db, query
+from utils import db, query, serializers
+from utils.rollups import PRACTICES_BY_STATE
+from utils.serializers import jsonify
 
 
 class State(db.Base):
@@ -20,22 +20,35 @@ class State(db.Base):
     overall_n_yield_lbs_per_ac = Column(Float(53))
 
 
-def get(state_id):
-    return jsonify(query.get(State, state_id))
+def get(state_id, fields=()):
+    return jsonify(
+        query.get(
+            State,
+            state_id,
+            columns=PRACTICES_BY_STATE.summary_columns(),
+            outer_joins=[
+                (PRACTICES_BY_STATE.table, PRACTICES_BY_STATE.table.c.state == State.id)
+            ],
+            fields=fields,
+        )
+    )
 
 
-def search(page, limit):
-    available_states = [
-        state
-        for (state,) in Practice.query.session.query(Practice.state)
-        .group_by(Practice.state)
-        .all()
-    ]
+def search(page, limit, cursor=None, count="exact", fields=()):
+    """Returns the states that have practices, with the totals of their practices."""
     return jsonify(
         query.search(
             model=State,
             page=page,
             limit=limit,
-            query_filters_config=[("id", "in_", available_states)],
+            # Joins the states to the rollup of their practices, which only has the states with practices
+            query_filters_config=[("id", "__eq__", PRACTICES_BY_STATE.table.c.state)],
+            columns=[
+                *serializers.model_columns(State),
+                *PRACTICES_BY_STATE.summary_columns(),
+            ],
+            fields=fields,
+            cursor=cursor,
+            count_mode=count,
         )
     )
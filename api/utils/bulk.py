@@ -0,0 +1,53 @@
+import io
+import json
+from typing import Any, Iterable, List
+
+from geoalchemy2 import WKBElement, WKTElement
+from pandas.io.sql import SQLTable
+from sqlalchemy.engine import Connection
+
+
+def _copy_value(value: Any) -> str:
+    """Encodes a value in the text format of `COPY`."""
+    if value is None:
+        return r"\N"
+
+    if isinstance(value, WKBElement):
+        # The geometry input function of PostGIS accepts hex encoded (E)WKB
+        text = value.desc
+    elif isinstance(value, WKTElement):
+        text = value.data if value.extended else f"SRID={value.srid};{value.data}"
+    elif isinstance(value, (dict, list)):
+        text = json.dumps(value)
+    else:
+        text = str(value)
+
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_insert(
+    table: SQLTable, connection: Connection, keys: List[str], data_iter: Iterable[tuple]
+):
+    """
+    An insertion method for `DataFrame.to_sql` that streams the rows to PostgreSQL with `COPY ... FROM STDIN`
+    instead of sending `INSERT` statements. It only works with the psycopg2 driver.
+    """
+    buffer = io.StringIO()
+    for row in data_iter:
+        buffer.write("\t".join(map(_copy_value, row)))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    preparer = connection.dialect.identifier_preparer
+    table_name = preparer.quote(table.name)
+    if table.schema:
+        table_name = f"{preparer.quote_schema(table.schema)}.{table_name}"
+    columns = ", ".join(map(preparer.quote, keys))
+
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN", buffer)
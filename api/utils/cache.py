@@ -0,0 +1,189 @@
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from flask import Flask, Response, g, request
+
+# Returns the version of the data and when it was updated (see `Database.get_data_version`)
+DataVersionGetter = Callable[[], Tuple[int, Optional[datetime]]]
+
+
+class CacheBackend(ABC):
+    """Stores the bodies of the cached responses by key."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """An LRU cache in the memory of the process, bounded by the total size of the cached values."""
+
+    def __init__(self, max_size: int):
+        """:param max_size: Maximum number of bytes of the cached values."""
+        self.max_size = max_size
+        self.size = 0
+        self.entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes):
+        if len(value) > self.max_size:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_size:
+                (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class RedisCache(CacheBackend):
+    """
+    A cache shared by all the processes of the API. It requires the `redis` package.
+    The redis server should be configured with an LRU `maxmemory-policy` to bound its size.
+    """
+
+    def __init__(self, url: str, ttl: int = 24 * 60 * 60):
+        """:param ttl: Seconds before a cached value expires, so the values of old data versions are removed."""
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes):
+        self.client.set(key, value, ex=self.ttl)
+
+
+def get_cache_backend(url: str, max_size: int) -> CacheBackend:
+    """
+    :param url: `memory` for a cache in each process, or the URL of a redis server.
+    :param max_size: Maximum number of bytes of a memory cache.
+    """
+    if url == "memory":
+        return MemoryCache(max_size)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url)
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+
+class ResponseCache:
+    """
+    Caches the successful responses of GET requests to some paths of a Flask app by their normalized URL.
+    Paths that end with `/` match all the paths that start with them.
+
+    The keys of the cache include the version of the data, so the cached responses are invalidated when the import
+    bumps the version. Responses have an ETag and a Last-Modified header (when the data was updated),
+    and conditional requests get a 304 response.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        get_data_version: DataVersionGetter,
+        paths: Iterable[str],
+        version_ttl: float = 5,
+    ):
+        """
+        :param paths: The paths of the cached requests, relative to the base path of the API.
+        :param version_ttl: Seconds that the data version is reused before reading it again.
+        """
+        self.backend = backend
+        self.get_data_version = get_data_version
+        self.paths = tuple(paths)
+        self.version_ttl = version_ttl
+        self.version: Tuple[int, Optional[datetime]] = (0, None)
+        self.version_read_at = None
+        self.lock = threading.Lock()
+
+    def init_app(self, app: Flask, base_path: str = ""):
+        self.paths = tuple(f"{base_path}{path}" for path in self.paths)
+        app.before_request(self.get_cached_response)
+        app.after_request(self.cache_response)
+
+    def data_version(self) -> Tuple[int, Optional[datetime]]:
+        with self.lock:
+            now = time.monotonic()
+            if (
+                self.version_read_at is None
+                or now - self.version_read_at > self.version_ttl
+            ):
+                self.version = self.get_data_version()
+                self.version_read_at = now
+            return self.version
+
+    def is_cached(self) -> bool:
+        return request.method == "GET" and any(
+            request.path.startswith(path)
+            if path.endswith("/")
+            else request.path == path
+            for path in self.paths
+        )
+
+    @staticmethod
+    def key(version: int) -> str:
+        # The links in the responses depend on the host, so the key has the whole URL
+        query_params = sorted(
+            parse_qsl(request.query_string.decode(), keep_blank_values=True),
+            key=lambda param: param[0],
+        )
+        return f"response:{version}:{request.base_url}?{urlencode(query_params)}"
+
+    @staticmethod
+    def make_conditional(
+        response: Response, body: bytes, updated_at: Optional[datetime]
+    ) -> Response:
+        response.set_etag(hashlib.sha1(body).hexdigest())
+        if updated_at:
+            response.last_modified = updated_at
+        return response.make_conditional(request)
+
+    def get_cached_response(self) -> Optional[Response]:
+        if not self.is_cached():
+            return None
+        # The version is kept for `cache_response`, so a response is never cached with a newer version than its data
+        g.data_version = self.data_version()
+        (version, updated_at) = g.data_version
+        value = self.backend.get(self.key(version))
+        if value is None:
+            return None
+        (mimetype, body) = value.split(b"\n", 1)
+        response = Response(body, mimetype=mimetype.decode())
+        response.headers["X-Cache"] = "HIT"
+        return self.make_conditional(response, body, updated_at)
+
+    def cache_response(self, response: Response) -> Response:
+        if (
+            not self.is_cached()
+            or response.status_code != 200
+            or response.is_streamed
+            or "X-Cache" in response.headers
+            or "data_version" not in g
+        ):
+            return response
+        (version, updated_at) = g.data_version
+        body = response.get_data()
+        self.backend.set(self.key(version), response.mimetype.encode() + b"\n" + body)
+        response.headers["X-Cache"] = "MISS"
+        return self.make_conditional(response, body, updated_at)
@@ -1,27 +1,150 @@
+import hashlib
 import json
 import logging
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from functools import reduce
-from typing import List
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import geopandas as gpd
+import numpy as np
+import openpyxl
 import pandas as pd
+import shapely.wkb
 import sqlalchemy
-from geoalchemy2 import Geometry, WKTElement
+from geoalchemy2 import Geometry, WKBElement
+from pandas.io.parsers import TextParser
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.engine.base import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
 
+from .bulk import copy_insert
+from .pool import MeteredQueuePool, add_process_guards
+from .profiling import LOGS_DIR, ImportReport, Stage, iterate_stage, merge_stages, stage
+from .reductions import PracticeReductions
+from .rollups import ROLLUPS
+
 Base = declarative_base()
 
+# Number of rows sent in each `COPY` when writing tables with `bulk_copy`
+COPY_CHUNK_SIZE = 50000
+
+# The HUC8 boundaries of the Watershed Boundary Dataset, and their layer
+HUC8_PATH = "./data/WBD_National_GDB/WBD_National_GDB.gdb"
+HUC8_LAYER = "WBDHU8"
+
+# The practices workbooks have a title row above the header row
+PRACTICES_HEADER_ROW = 1
+
+PRACTICES_DTYPE = {
+    "HUC 8": "str",
+    "HUC 12": "str",
+    "County Code": "str",
+    "NRCS Practice Code": "str",
+    "Applied Date": "Int64",
+}
+
+# Column types of the practices table. They are declared explicitly so that the table has the same schema
+# regardless of the types pandas infers for the first chunk written to it.
+PRACTICES_SQL_DTYPE = {
+    "huc_8": sqlalchemy.types.Text,
+    "huc_12": sqlalchemy.types.Text,
+    "state": sqlalchemy.types.Text,
+    "county_code": sqlalchemy.types.Text,
+    "county": sqlalchemy.types.Text,
+    "nrcs_practice_code": sqlalchemy.types.Text,
+    "practice_name": sqlalchemy.types.Text,
+    "program": sqlalchemy.types.Text,
+    "fund_code": sqlalchemy.types.Text,
+    "applied_amount": sqlalchemy.types.Float(53),
+    "practice_units": sqlalchemy.types.Text,
+    "applied_date": sqlalchemy.BIGINT,
+    "funding": sqlalchemy.types.Float(53),
+    "sunset": sqlalchemy.BIGINT,
+    "active_year": sqlalchemy.BIGINT,
+    "category": sqlalchemy.types.Text,
+    "wq_benefits": sqlalchemy.types.Text,
+    "area_treated": sqlalchemy.types.Float(53),
+    "ancillary_benefits": JSONB,
+    "p_reduction_fraction": sqlalchemy.types.Float(53),
+    "n_reduction_fraction": sqlalchemy.types.Float(53),
+    "p_reduction_percentage_statewide": sqlalchemy.types.Float(53),
+    "n_reduction_percentage_statewide": sqlalchemy.types.Float(53),
+    "p_reduction_gom_lbs": sqlalchemy.types.Float(53),
+    "n_reduction_gom_lbs": sqlalchemy.types.Float(53),
+    "source_file": sqlalchemy.types.Text,
+    "source_row": sqlalchemy.BIGINT,
+}
+
+# The indexes of the practices table as (name, method, columns). The single column indexes match the filters
+# of the practices endpoint, and the composite ones its most common combinations and the `GROUP BY` of
+# the states and HUC8 endpoints. The GIN index supports the `?|` operator of the ancillary benefits filter.
+PRACTICES_INDEXES = (
+    ("huc_8", "btree", ("huc_8",)),
+    ("state", "btree", ("state",)),
+    ("nrcs_practice_code", "btree", ("nrcs_practice_code",)),
+    ("applied_date", "btree", ("applied_date",)),
+    ("sunset", "btree", ("sunset",)),
+    ("category", "btree", ("category",)),
+    ("program", "btree", ("program",)),
+    ("state_applied_date", "btree", ("state", "applied_date")),
+    ("huc_8_applied_date", "btree", ("huc_8", "applied_date")),
+    ("applied_date_sunset", "btree", ("applied_date", "sunset")),
+    ("ancillary_benefits", "gin", ("ancillary_benefits",)),
+)
+
+# The simplified geometries of the HUC8s built for maps, as (maximum zoom level, simplification tolerance in degrees).
+# Each geometry is used for the zoom levels up to its maximum, and the last one for all the zoom levels above.
+HUC8_SIMPLIFICATIONS = (
+    (4, 0.02),
+    (7, 0.005),
+    (10, 0.001),
+    (13, 0.0002),
+)
+
+# Number of connections of the engine that counts the results of the API searches (see `query.run_concurrently`).
+# It's separate from the pool of the requests, so the counts never wait for a connection held by a request
+# that is itself waiting for its count.
+COUNT_POOL_SIZE = 4
+
 
 class Database:
     engine: Engine
 
     db_session: scoped_session
 
-    def __init__(self, host: str, port: str, user: str, password: str, db_name: str):
+    def __init__(
+        self,
+        host: str,
+        port: str,
+        user: str,
+        password: str,
+        db_name: str,
+        bulk_copy: bool = True,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: float = 30,
+        pool_pre_ping: bool = True,
+        statement_timeout: int = 0,
+        profile_imports: bool = False,
+    ):
+        """
+        :param bulk_copy: Whether to write the imported tables with `COPY` instead of `INSERT` statements.
+        :param pool_size: Number of connections kept open by the connection pool.
+        :param max_overflow: Number of connections that can be opened above `pool_size` when they are all in use.
+        :param pool_timeout: Seconds to wait for a connection when the pool is exhausted.
+        :param pool_pre_ping: Whether to test the connections when they are checked out of the pool,
+               to replace the ones closed by the server.
+        :param statement_timeout: Milliseconds after which the server cancels a statement. 0 disables the timeout.
+        :param profile_imports: Whether to profile the imports with cProfile, in addition to timing their stages
+               (see `ImportReport`).
+        """
         cred = []
         if user:
             cred.append(user)
@@ -34,69 +157,178 @@ class Database:
         db_uri = f"postgresql+psycopg2://{cred}{host}:{port}/{db_name}"
         logging.info(db_uri)
 
-        self.engine = create_engine(db_uri, convert_unicode=True)
+        connect_args = {}
+        if statement_timeout > 0:
+            connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+
+        self.engine = create_engine(
+            db_uri,
+            convert_unicode=True,
+            poolclass=MeteredQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_pre_ping=pool_pre_ping,
+            connect_args=connect_args,
+        )
+        add_process_guards(self.engine)
+        self.count_engine = create_engine(
+            db_uri,
+            convert_unicode=True,
+            poolclass=MeteredQueuePool,
+            pool_size=COUNT_POOL_SIZE,
+            max_overflow=0,
+            pool_timeout=pool_timeout,
+            pool_pre_ping=pool_pre_ping,
+            connect_args=connect_args,
+        )
+        add_process_guards(self.count_engine)
         db_session = scoped_session(
-            sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+            sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                bind=self.engine,
+                info={"count_bind": self.count_engine},
+            )
         )
 
         Base.query = db_session.query_property()
 
         self.db_session = db_session
 
+        self.bulk_copy = bulk_copy and self.engine.dialect.driver == "psycopg2"
+        self.profile_imports = profile_imports
+
     def get_session(self):
         return self.db_session
 
+    def remove_session(self):
+        """Closes the session of the current thread and returns its connection to the pool."""
+        self.db_session.remove()
+
+    def get_pool_metrics(self) -> dict:
+        return self.engine.pool.metrics()
+
     def shutdown(self):
         if self.db_session:
             self.db_session.remove()
         if self.engine:
             self.engine.dispose()
+            self.count_engine.dispose()
 
     @staticmethod
     def clean_column_names(df: pd.DataFrame):
-        return (
-            df.columns.str.strip()
-            .str.lower()
-            .str.replace(" ", "_")
-            .str.replace("[()]", "")
+        with stage("clean_columns"):
+            return (
+                df.columns.str.strip()
+                .str.lower()
+                .str.replace(" ", "_")
+                .str.replace("[()]", "")
+            )
+
+    def write_table(self, df: pd.DataFrame, table_name: str, **kwargs) -> float:
+        """
+        Writes a DataFrame to a table with `DataFrame.to_sql`, streaming the rows with `COPY` if `bulk_copy` is set.
+
+        :param kwargs: Extra arguments passed to `DataFrame.to_sql`.
+        :return: The number of rows written per second.
+        """
+        start = time.perf_counter()
+        with stage(f"write_{table_name}") as write:
+            if self.bulk_copy:
+                df.to_sql(
+                    table_name,
+                    con=self.engine,
+                    method=copy_insert,
+                    chunksize=COPY_CHUNK_SIZE,
+                    **kwargs,
+                )
+            else:
+                df.to_sql(table_name, con=self.engine, **kwargs)
+            write.rows = len(df)
+        elapsed = time.perf_counter() - start
+
+        rows_per_second = len(df) / elapsed if elapsed else float("inf")
+        print(
+            f"Wrote {len(df)} rows to {table_name} in {elapsed:.2f}s ({rows_per_second:.0f} rows/sec)"
         )
+        return rows_per_second
 
-    def prepare(self):
+    def prepare(self, huc8_path: str = HUC8_PATH):
+        """:param huc8_path: Path of a dataset with a `HUC8_LAYER` layer, e.g. the WBD GeoDatabase."""
         print("Preparing database...")
-        self.import_states()
-        self.import_assumptions()
-        self.import_huc8_meta()
-        self.import_huc8()
+        with ImportReport("prepare", self.profile_imports).run():
+            self.import_states()
+            self.import_assumptions()
+            self.import_huc8_meta()
+            self.import_huc8(huc8_path)
+            with self.engine.begin() as connection:
+                self.bump_data_version(connection)
+            # The states and HUC8s are joined to the rollups of the practices
+            self.upgrade()
+
+    def upgrade(self):
+        """
+        Creates the tables derived from the imported data that are missing in a database
+        prepared or imported by an older version, e.g. the rollups of the practices or the simplified HUC8s.
+        """
+        with self.engine.connect() as connection:
+            missing_huc8_simplified = self.table_exists(
+                connection, "huc8"
+            ) and not self.table_exists(connection, "huc8_simplified")
+            has_practices = self.table_exists(connection, "practices")
+            missing_rollups = [
+                rollup.name
+                for rollup in ROLLUPS
+                if not self.table_exists(connection, rollup.name)
+            ]
+        if missing_huc8_simplified:
+            self.simplify_huc8("huc8", "huc8_simplified_temp")
+            self.swap_tables("huc8_simplified")
+        if has_practices and missing_rollups:
+            print(f"Building the missing rollups: {', '.join(missing_rollups)}...")
+            with self.engine.begin() as connection:
+                self.build_rollups(connection, "practices", "_temp")
+            self.swap_tables(*[rollup.name for rollup in ROLLUPS])
 
     def import_states(self):
         print("Loading States...")
-        states = pd.read_excel(
-            "./data/boundaries.xlsx",
-            sheet_name="States",
-            dtype={
-                "state": "str",
-                "area_sq_mi": "float64",
-                "size_ac": "float64",
-                "total_p_load_lbs": "float64",
-                "total_n_load_lbs": "float64",
-                "rowcrop_p_yield_lbs_per_ac": "float64",
-                "rowcrop_n_yield_lbs_per_ac": "float64",
-                "fraction_p": "float64",
-                "fraction_n": "float64",
-                "overall_p_yield_lbs_per_ac": "float64",
-                "overall_n_yield_lbs_per_ac": "float64",
-            },
-        )
+        with stage("read_states") as read:
+            states = pd.read_excel(
+                "./data/boundaries.xlsx",
+                sheet_name="States",
+                dtype={
+                    "state": "str",
+                    "area_sq_mi": "float64",
+                    "size_ac": "float64",
+                    "total_p_load_lbs": "float64",
+                    "total_n_load_lbs": "float64",
+                    "rowcrop_p_yield_lbs_per_ac": "float64",
+                    "rowcrop_n_yield_lbs_per_ac": "float64",
+                    "fraction_p": "float64",
+                    "fraction_n": "float64",
+                    "overall_p_yield_lbs_per_ac": "float64",
+                    "overall_n_yield_lbs_per_ac": "float64",
+                },
+            )
+            read.rows = len(states)
 
         print("Importing States...")
-        states.set_index(states["state"]).sort_index().drop("state", axis=1).to_sql(
-            "states", con=self.engine, index_label="id", if_exists="replace"
+        self.write_table(
+            states.set_index(states["state"]).sort_index().drop("state", axis=1),
+            "states",
+            index_label="id",
+            if_exists="replace",
         )
 
     def import_assumptions(self):
         print("Loading assumptions...")
         source_file = "./data/assumptions.xlsx"
-        assumptions = pd.read_excel(source_file, sheet_name="Practices", dtype="str")
+        with stage("read_assumptions") as read:
+            assumptions = pd.read_excel(
+                source_file, sheet_name="Practices", dtype="str"
+            )
+            read.rows = len(assumptions)
         assumptions["wq"] = pd.to_numeric(assumptions["wq"]).astype("Int64")
         assumptions = (
             assumptions.set_index(assumptions["code"]).sort_index().drop("code", axis=1)
@@ -105,7 +337,9 @@ class Database:
         def join_json_columns(main: pd.DataFrame, sheet_info: (str, str)):
             (sheet_name, column_name) = sheet_info
 
-            sheet = pd.read_excel(source_file, sheet_name=sheet_name, dtype="str")
+            with stage("read_assumptions") as read:
+                sheet = pd.read_excel(source_file, sheet_name=sheet_name, dtype="str")
+                read.rows = len(sheet)
             sheet = (
                 sheet.set_index(sheet["code"])
                 .sort_index()
@@ -117,7 +351,7 @@ class Database:
             return main.join(sheet[column_name], on="code")
 
         print("Importing assumptions...")
-        reduce(
+        assumptions = reduce(
             join_json_columns,
             (
                 ("Water Quality Benefits", "wq_benefits"),
@@ -130,9 +364,10 @@ class Database:
                 ("Ancillary Benefits", "ancillary_benefits"),
             ),
             assumptions,
-        ).to_sql(
+        )
+        self.write_table(
+            assumptions,
             "assumptions",
-            con=self.engine,
             index_label="id",
             if_exists="replace",
             dtype={
@@ -150,32 +385,33 @@ class Database:
     def import_huc8_meta(self):
         print("Loading HUC8 metadata...")
         source_file = "./data/boundaries.xlsx"
-        huc8_meta = pd.read_excel(
-            source_file,
-            sheet_name="HUC8",
-            dtype={
-                "code": "str",
-                "area_ac": "float64",
-                "rowcrop_p_yield_lbs_per_ac": "float64",
-                "total_p_yield_lbs_per_ac": "float64",
-                "total_p_sparrow_lbs": "float64",
-                "total_p_sparrow_adjusted_usgs_lbs": "float64",
-                "adjusted_rowcrop_p_yield_lbs_per_ac": "float64",
-                "rowcrop_n_yield_lbs_per_ac": "float64",
-                "total_n_yield_lbs_per_ac": "float64",
-                "total_n_sparrow_lbs": "float64",
-                "total_n_sparrow_adjusted_usgs_lbs": "float64",
-                "adjusted_rowcrop_n_yield_lbs_per_ac": "float64",
-            },
-        )
+        with stage("read_huc8_meta") as read:
+            huc8_meta = pd.read_excel(
+                source_file,
+                sheet_name="HUC8",
+                dtype={
+                    "code": "str",
+                    "area_ac": "float64",
+                    "rowcrop_p_yield_lbs_per_ac": "float64",
+                    "total_p_yield_lbs_per_ac": "float64",
+                    "total_p_sparrow_lbs": "float64",
+                    "total_p_sparrow_adjusted_usgs_lbs": "float64",
+                    "adjusted_rowcrop_p_yield_lbs_per_ac": "float64",
+                    "rowcrop_n_yield_lbs_per_ac": "float64",
+                    "total_n_yield_lbs_per_ac": "float64",
+                    "total_n_sparrow_lbs": "float64",
+                    "total_n_sparrow_adjusted_usgs_lbs": "float64",
+                    "adjusted_rowcrop_n_yield_lbs_per_ac": "float64",
+                },
+            )
+            read.rows = len(huc8_meta)
 
         huc8_meta.columns = self.clean_column_names(huc8_meta)
 
-        huc8_meta.set_index(huc8_meta["code"]).sort_index().drop("code", axis=1)
-
-        huc8_meta.to_sql(
+        # The table keeps the row numbers as its index, and `get_huc8_meta` indexes it by code
+        self.write_table(
+            huc8_meta,
             "huc8_meta",
-            con=self.engine,
             if_exists="replace",
             dtype={
                 "states": sqlalchemy.types.JSON,
@@ -183,32 +419,59 @@ class Database:
             },
         )
 
-    def import_huc8(self):
+    def import_huc8(self, huc8_path: str = HUC8_PATH):
         print("Loading HUC8s...")
-        huc8 = gpd.read_file(
-            "./data/WBD_National_GDB/WBD_National_GDB.gdb", layer="WBDHU8"
-        )
-        huc8.to_crs("EPSG:4326", inplace=True)
+        with stage("read_huc8") as read:
+            huc8 = gpd.read_file(huc8_path, layer=HUC8_LAYER)
+            huc8.to_crs("EPSG:4326", inplace=True)
+            read.rows = len(huc8)
         huc8.columns = self.clean_column_names(huc8)
         huc8.huc8 = huc8.huc8.astype(str)
         huc8.sort_values(by=["huc8"], inplace=True)
         huc8 = huc8[["huc8", "name", "areaacres", "states", "geometry"]]
         huc8["states"] = huc8["states"].apply(lambda x: x.split(","))
         huc8["geometry"] = huc8["geometry"].apply(
-            lambda geom: WKTElement(geom.wkt, srid=4326)
+            lambda geom: WKBElement(
+                shapely.wkb.dumps(geom, srid=4326), srid=4326, extended=True
+            )
         )
         huc8.set_index("huc8", inplace=True)
 
         print("Importing HUC8s...")
-        huc8.to_sql(
-            "huc8",
-            con=self.engine,
+        self.write_table(
+            huc8,
+            "huc8_temp",
             if_exists="replace",
             dtype={
                 "states": sqlalchemy.types.JSON,
                 "geometry": Geometry("MultiPolygon", srid=4326),
             },
         )
+        self.simplify_huc8("huc8_temp", "huc8_simplified_temp")
+        self.swap_tables("huc8", "huc8_simplified")
+
+    def simplify_huc8(self, source_table: str, table_name: str):
+        """Creates a table with the geometries of the HUC8s simplified for each level of `HUC8_SIMPLIFICATIONS`."""
+        start = time.perf_counter()
+        levels = " UNION ALL ".join(
+            f"SELECT huc8, {max_zoom} AS max_zoom, "
+            f"ST_Multi(ST_SimplifyPreserveTopology(geometry, {tolerance}))::geometry(MultiPolygon, 4326) AS geometry "
+            f"FROM {source_table}"
+            for max_zoom, tolerance in HUC8_SIMPLIFICATIONS
+        )
+        with stage("simplify_huc8"), self.engine.begin() as connection:
+            connection.execute(f"DROP TABLE IF EXISTS {table_name}")
+            connection.execute(f"CREATE TABLE {table_name} AS {levels}")
+            connection.execute(
+                f"CREATE INDEX ix_{table_name}_max_zoom_huc8 ON {table_name} (max_zoom, huc8)"
+            )
+            connection.execute(
+                f"CREATE INDEX ix_{table_name}_geometry ON {table_name} USING gist (geometry)"
+            )
+            connection.execute(f"ANALYZE {table_name}")
+        print(
+            f"Simplified HUC8s into {table_name} in {time.perf_counter() - start:.2f}s"
+        )
 
     def get_states(self):
         return pd.read_sql("SELECT * FROM states", con=self.engine, index_col="id")
@@ -217,251 +480,600 @@ class Database:
         return pd.read_sql("SELECT * FROM assumptions", con=self.engine, index_col="id")
 
     def get_huc8_meta(self):
+        """:return: The HUC8 metadata indexed by code, the key of the HUC8 of the practices."""
         huc8_meta = pd.read_sql(
             sql="SELECT * FROM huc8_meta", con=self.engine, index_col="index"
         )
         huc8_meta["code"] = huc8_meta["code"].astype("string")
-        return huc8_meta
+        return huc8_meta.set_index("code")
 
-    def import_practices(self, practices_paths: List[str]):
-        states = self.get_states()
-        assumptions = self.get_assumptions()
-        huc8_meta = self.get_huc8_meta()
+    @staticmethod
+    def get_baselines():
+        with open("./data/baselines.json", "r") as f:
+            return json.loads(f.read())
 
-        all_practices = []
-        for practices_path in practices_paths:
-            print("Getting practices...")
+    def get_practice_reductions(self) -> PracticeReductions:
+        with stage("read_reductions"):
+            return PracticeReductions(
+                assumptions=self.get_assumptions(),
+                states=self.get_states(),
+                huc8_meta=self.get_huc8_meta(),
+                baselines=self.get_baselines(),
+            )
+
+    @classmethod
+    def read_practices(cls, practices_path: str) -> pd.DataFrame:
+        print(f"Getting practices from {practices_path}...")
+        with stage("read_practices") as read:
             practices = pd.read_excel(
                 practices_path,
-                header=1,
+                header=PRACTICES_HEADER_ROW,
                 usecols="A:M",
-                dtype={
-                    "HUC 8": "str",
-                    "HUC 12": "str",
-                    "County Code": "str",
-                    "NRCS Practice Code": "str",
-                    "Applied Date": "Int64",
-                },
+                dtype=PRACTICES_DTYPE,
                 parse_dates=False,
             )
-            practices.columns = self.clean_column_names(practices)
-            all_practices.append(practices)
-        all_practices = pd.concat(all_practices)
-        all_practices.columns = self.clean_column_names(all_practices)
-        all_practices.index += 1
+            read.rows = len(practices)
+        practices.columns = cls.clean_column_names(practices)
+        return cls._set_source(practices, practices_path)
 
-        print("Updating practices...")
-        missing_huc8 = set()
-        sunset = []
-        active_year = []
-        category = []
-        wq_benefits = []
-        area_treated = []
-        ancillary_benefits = []
-        p_reduction_fraction = []
-        n_reduction_fraction = []
-        p_reduction_percentage_statewide = []
-        n_reduction_percentage_statewide = []
-        p_reduction_gom_lbs = []
-        n_reduction_gom_lbs = []
+    @staticmethod
+    def _set_source(
+        practices: pd.DataFrame, practices_path: str, first_row: int = 1
+    ) -> pd.DataFrame:
+        """Adds the columns that identify the workbook and the row each practice was read from."""
+        practices["source_file"] = os.path.basename(practices_path)
+        practices["source_row"] = np.arange(first_row, first_row + len(practices))
+        return practices
 
-        with open("./data/baselines.json", "r") as f:
-            baselines = json.loads(f.read())
-
-        def get_nutrient_reduction(
-            nutrient,
-            huc8_rowcrop_nutrient_str,
-            state_sum_total_nutrient_load_lbs,
-            state_total_nutrient_load_lbs,
-            nutrient_reduction_fraction,
-            nutrient_reduction_percentage_statewide,
-        ):
-            practice_nutrient = practice_assumptions[nutrient]
-            if not pd.isna(practice_nutrient):
-                state_nutrient_yield = float(
-                    practice_nutrient[row.state] if practice_nutrient[row.state] else 0
-                )
-                if state_nutrient_yield <= 0:
-                    state_nutrient_yield = float(
-                        practice_nutrient["STEPL 4.4"]
-                        if practice_nutrient["STEPL 4.4"]
-                        else 0
-                    )
+    @staticmethod
+    def _convert_cell(value):
+        """Converts a cell value the same way `pd.read_excel` does before parsing it."""
+        if value is None:
+            return ""
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
 
-                try:
-                    huc8_nutrient_yield = huc8_meta.loc[row.huc_8][
-                        huc8_rowcrop_nutrient_str
-                    ]
-                except KeyError:
-                    huc8_nutrient_yield = 0
-                    missing_huc8.add(row.huc_8)
-
-                nutrient_reduction_fraction.append(
-                    state_nutrient_yield
-                    * huc8_nutrient_yield
-                    * area_treated[-1]
-                    / state_sum_total_nutrient_load_lbs
-                )
-                nutrient_reduction_percentage_statewide.append(
-                    state_nutrient_yield
-                    * huc8_nutrient_yield
-                    * area_treated[-1]
-                    / state_total_nutrient_load_lbs
+    @classmethod
+    def iter_practices(
+        cls, practices_path: str, chunk_size: int
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Reads the first sheet of a practices workbook in chunks of `chunk_size` rows.
+        The workbook is streamed with openpyxl in read-only mode, and each chunk is parsed the same way
+        `read_practices` parses a whole sheet, so only one chunk is held in memory at a time.
+        """
+        print(f"Streaming practices from {practices_path}...")
+        workbook = openpyxl.load_workbook(
+            practices_path, read_only=True, data_only=True, keep_links=False
+        )
+        try:
+            rows = workbook.worksheets[0].iter_rows(
+                min_row=PRACTICES_HEADER_ROW + 1, max_col=13, values_only=True
+            )
+            header = next(rows, None)
+            if header is None:
+                return
+
+            def parse(chunk: List[list], first_row: int) -> pd.DataFrame:
+                practices = TextParser(
+                    [header, *chunk], header=0, dtype=PRACTICES_DTYPE
+                ).read()
+                practices.columns = cls.clean_column_names(practices)
+                return cls._set_source(practices, practices_path, first_row)
+
+            chunk = []
+            # Empty rows are only kept if a row with values follows them, since `pd.read_excel` drops
+            # the empty rows at the end of a sheet, e.g. the rows that are only formatted
+            empty_rows = []
+            first_row = 1
+            for row in rows:
+                row = [cls._convert_cell(value) for value in row]
+                if all(value == "" for value in row):
+                    empty_rows.append(row)
+                    continue
+                for row in [*empty_rows, row]:
+                    chunk.append(row)
+                    if len(chunk) == chunk_size:
+                        practices = parse(chunk, first_row)
+                        first_row += len(practices)
+                        yield practices
+                        chunk = []
+                empty_rows = []
+            if chunk:
+                yield parse(chunk, first_row)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def bump_data_version(connection):
+        """
+        Increments the version of the data served by the API, which invalidates the responses cached by the API.
+        It should be called in the transaction that changes the data.
+        """
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                version BIGINT NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+            """
+        )
+        connection.execute(
+            """
+            INSERT INTO data_version (version, updated_at) VALUES (1, now())
+            ON CONFLICT (id) DO UPDATE SET version = data_version.version + 1, updated_at = now()
+            """
+        )
+
+    @staticmethod
+    def table_exists(connection, table_name: str) -> bool:
+        (exists,) = connection.execute(
+            sqlalchemy.text("SELECT to_regclass(:table_name) IS NOT NULL"),
+            table_name=table_name,
+        ).first()
+        return exists
+
+    def get_data_version(self) -> Tuple[int, Optional[datetime]]:
+        """:return: The version of the data and when it was updated, or `(0, None)` before the first import."""
+        with self.engine.connect() as connection:
+            if not self.table_exists(connection, "data_version"):
+                return 0, None
+            row = connection.execute(
+                "SELECT version, updated_at FROM data_version"
+            ).first()
+        return (row.version, row.updated_at) if row else (0, None)
+
+    def swap_tables(self, *table_names: str):
+        """
+        Replaces each table with its `<table>_temp` counterpart in a single transaction,
+        and renames the indexes of the temp tables to match their new table name.
+        """
+        with stage("swap_tables"), self.engine.begin() as connection:
+            self.bump_data_version(connection)
+            for table_name in table_names:
+                temp_table_name = f"{table_name}_temp"
+                connection.execute(f"DROP TABLE IF EXISTS {table_name}")
+                connection.execute(
+                    f"ALTER TABLE {temp_table_name} RENAME TO {table_name}"
                 )
-            else:
-                nutrient_reduction_fraction.append(0)
-                nutrient_reduction_percentage_statewide.append(0)
-
-        for _, row in all_practices.iterrows():
-            if row.nrcs_practice_code != "0":
-                practice_assumptions = assumptions.loc[row.nrcs_practice_code]
-
-                # Sunset
-                practice_life_span = practice_assumptions["life_span"]
-                if not pd.isna(practice_life_span):
-                    sunset.append(
-                        row.applied_date + int(practice_life_span[row.state]) - 1
-                    )
-                else:
-                    sunset.append(row.applied_date)
-
-                # Active Year
-                if (
-                    not pd.isna(row.applied_date)
-                    and not pd.isna(sunset[-1])
-                    and row.applied_date == sunset[-1]
+                for (index_name,) in connection.execute(
+                    sqlalchemy.text(
+                        "SELECT indexname FROM pg_indexes WHERE tablename = :table_name"
+                    ),
+                    table_name=table_name,
                 ):
-                    active_year.append(row.applied_date)
-                else:
-                    active_year.append(None)
-
-                # Category
-                practice_category = practice_assumptions["category"]
-                if not pd.isna(practice_category):
-                    category.append(practice_category[row.state])
-                else:
-                    category.append(None)
-
-                # Water Quality Benefits
-                practice_wq_benefit = practice_assumptions["wq_benefits"]
-                if not pd.isna(practice_wq_benefit):
-                    wq_benefits.append(practice_wq_benefit[row.state])
-                else:
-                    wq_benefits.append(None)
-
-                # Area Treated
-                if row.practice_units == "sq ft":
-                    area_treated.append(row.applied_amount / 43560)
-                else:
-                    practice_conversion_factor = practice_assumptions["conv"]
-                    if not pd.isna(practice_conversion_factor):
-                        area_treated.append(
-                            row.applied_amount
-                            * float(practice_conversion_factor[row.state])
+                    if temp_table_name in index_name:
+                        new_index_name = index_name.replace(temp_table_name, table_name)
+                        connection.execute(
+                            f'ALTER INDEX "{index_name}" RENAME TO "{new_index_name}"'
                         )
-                    else:
-                        area_treated.append(None)
-
-                # Ancillary Benefits
-                practice_ancillary_benefits = practice_assumptions["ancillary_benefits"]
-                if not pd.isna(practice_ancillary_benefits):
-                    ancillary_benefits.append(
-                        list(
-                            filter(
-                                lambda benefit: practice_ancillary_benefits[benefit]
-                                == "1",
-                                practice_ancillary_benefits,
+
+    def create_practices_indexes(self, table_name: str):
+        """Creates the `PRACTICES_INDEXES` on a practices table and updates its planner statistics."""
+        for name, method, columns in PRACTICES_INDEXES:
+            start = time.perf_counter()
+            with stage("build_indexes"):
+                self.engine.execute(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table_name}_{name} "
+                    f"ON {table_name} USING {method} ({', '.join(columns)})"
+                )
+            print(
+                f"Created index ix_{table_name}_{name} in {time.perf_counter() - start:.2f}s"
+            )
+        with stage("analyze"):
+            self.engine.execute(f"ANALYZE {table_name}")
+
+    def build_rollups(self, connection, source_table: str, suffix: str = ""):
+        """
+        Creates the rollup tables of the practices (see `utils.rollups`) from `source_table`.
+
+        :param suffix: Suffix of the names of the created tables, e.g. `_temp` to build them before `swap_tables`.
+        """
+        for rollup in ROLLUPS:
+            start = time.perf_counter()
+            with stage("build_rollups"):
+                for statement in rollup.create_statements(
+                    source_table, f"{rollup.name}{suffix}"
+                ):
+                    connection.execute(statement)
+            print(f"Built {rollup.name}{suffix} in {time.perf_counter() - start:.2f}s")
+
+    def derive_practices(
+        self,
+        practice_reductions: PracticeReductions,
+        practices_paths: List[str],
+        chunk_size: int = 0,
+        workers: int = 1,
+    ) -> Iterator[Tuple[pd.DataFrame, Set[str]]]:
+        """
+        Reads the practices workbooks and computes their derived columns.
+        See `import_practices` for the description of the parameters.
+
+        :return: An iterator of practices with their derived columns, and the HUC8s missing from the HUC8 metadata.
+        """
+        if workers > 1 and len(practices_paths) > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_practices_worker,
+                initargs=(practice_reductions,),
+            ) as executor:
+                # Keep at most `workers` workbooks in flight, and yield them in the order of their paths
+                paths = iter(practices_paths)
+                pending = deque(
+                    executor.submit(_derive_practices_file, practices_path)
+                    for practices_path in islice(paths, workers)
+                )
+                while pending:
+                    (
+                        practices_path,
+                        practices,
+                        missing_huc8,
+                        elapsed,
+                        stages,
+                    ) = pending.popleft().result()
+                    merge_stages(stages)
+                    for practices_path_to_submit in islice(paths, 1):
+                        pending.append(
+                            executor.submit(
+                                _derive_practices_file, practices_path_to_submit
                             )
                         )
+                    print(
+                        f"Processed {len(practices)} practices from {practices_path} in {elapsed:.2f}s"
                     )
-                else:
-                    ancillary_benefits.append([])
+                    yield practices, missing_huc8
+            return
 
-                # Phosphorus and Nitrogen Reduction (fraction and statewide percentage)
-                for nutrient_reduction_fraction_args in (
-                    (
-                        "phosphorus",
-                        "rowcrop_p_yield_lbs_per_ac",
-                        states.total_p_load_lbs.sum(),
-                        states.loc[row.state].total_p_load_lbs,
-                        p_reduction_fraction,
-                        p_reduction_percentage_statewide,
-                    ),
-                    (
-                        "nitrogen",
-                        "rowcrop_n_yield_lbs_per_ac",
-                        states.total_n_load_lbs.sum(),
-                        states.loc[row.state].total_n_load_lbs,
-                        n_reduction_fraction,
-                        n_reduction_percentage_statewide,
-                    ),
-                ):
-                    get_nutrient_reduction(*nutrient_reduction_fraction_args)
+        for practices_path in practices_paths:
+            elapsed = 0
+            practices_count = 0
+            start = time.perf_counter()
+            if chunk_size > 0:
+                chunks = iterate_stage(
+                    "read_practices", self.iter_practices(practices_path, chunk_size)
+                )
+            else:
+                chunks = [self.read_practices(practices_path)]
+            for practices in chunks:
+                print("Updating practices...")
+                with stage("derive_columns") as derive:
+                    calculated_columns, missing_huc8 = practice_reductions.compute(
+                        practices
+                    )
+                    derive.rows = len(practices)
+                practices_count += len(practices)
+                elapsed += time.perf_counter() - start
+                yield practices.join(calculated_columns), missing_huc8
+                start = time.perf_counter()
+            print(
+                f"Processed {practices_count} practices from {practices_path} in {elapsed:.2f}s"
+            )
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        sha256 = hashlib.sha256()
+        with stage("hash_files"), open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def get_practice_sources(self) -> Optional[pd.DataFrame]:
+        """
+        :return: The fingerprints of the workbooks in the `practices` table indexed by their file name,
+                 or None if the table can't be updated incrementally, e.g. because it was created by an older version.
+        """
+        (can_update,) = self.engine.execute(
+            "SELECT to_regclass('practice_sources') IS NOT NULL AND to_regclass('ix_practices_source') IS NOT NULL"
+            # Created with the JSONB ancillary benefits column
+            " AND to_regclass('ix_practices_ancillary_benefits') IS NOT NULL"
+        ).first()
+        if not can_update:
+            return None
+        return pd.read_sql(
+            "SELECT * FROM practice_sources", con=self.engine, index_col="source_file"
+        )
+
+    def write_practices(
+        self,
+        practice_reductions: PracticeReductions,
+        practices_paths: List[str],
+        table_name: str,
+        chunk_size: int = 0,
+        workers: int = 1,
+    ) -> Tuple[Dict[str, int], Set[str]]:
+        """
+        Writes the practices of the workbooks with their derived columns to a new table.
+        The ids of the practices start from 1.
 
-                # Phosphorus Reduction at GOM (lbs)
-                p_reduction_gom_lbs.append(
-                    p_reduction_fraction[-1] * baselines["usgs_baseline_p_lbs"]
+        :return: The number of practices of each workbook by file name, and the HUC8s missing from the HUC8 metadata.
+        """
+        self.engine.execute(f"DROP TABLE IF EXISTS {table_name}")
+
+        practices_counts = {}
+        missing_huc8 = set()
+        imported_count = 0
+        for practices, practices_missing_huc8 in self.derive_practices(
+            practice_reductions, practices_paths, chunk_size, workers
+        ):
+            practices.index = pd.RangeIndex(
+                imported_count + 1, imported_count + len(practices) + 1
+            )
+            for source_file, count in practices["source_file"].value_counts().items():
+                practices_counts[source_file] = (
+                    practices_counts.get(source_file, 0) + count
                 )
+            missing_huc8.update(practices_missing_huc8)
 
-                # Nitrogen Reduction at GOM (lbs)
-                n_reduction_gom_lbs.append(
-                    n_reduction_fraction[-1] * baselines["usgs_baseline_n_lbs"]
+            print("Importing practices...")
+            self.write_table(
+                practices,
+                table_name,
+                index_label="id",
+                dtype=PRACTICES_SQL_DTYPE,
+                if_exists="append",
+            )
+            imported_count += len(practices)
+
+        return practices_counts, missing_huc8
+
+    @staticmethod
+    def practice_sources_frame(
+        practices_paths: List[str],
+        practices_counts: Dict[str, int],
+        practice_reductions: PracticeReductions,
+        digests: Optional[Dict[str, str]] = None,
+    ) -> pd.DataFrame:
+        """:param digests: The SHA-256 of the workbooks that were already hashed by path, the others are hashed."""
+        digests = digests or {}
+        imported_at = pd.Timestamp.now()
+        return pd.DataFrame(
+            [
+                {
+                    "source_file": os.path.basename(practices_path),
+                    "sha256": digests.get(practices_path)
+                    or Database.hash_file(practices_path),
+                    "reductions_sha256": practice_reductions.fingerprint,
+                    "row_count": practices_counts.get(
+                        os.path.basename(practices_path), 0
+                    ),
+                    "imported_at": imported_at,
+                }
+                for practices_path in practices_paths
+            ],
+            columns=[
+                "source_file",
+                "sha256",
+                "reductions_sha256",
+                "row_count",
+                "imported_at",
+            ],
+        ).set_index("source_file")
+
+    def import_practices(
+        self,
+        practices_paths: List[str],
+        chunk_size: int = 0,
+        workers: int = 1,
+        incremental: bool = False,
+    ):
+        """
+        :param practices_paths: Paths of the practices workbooks.
+        :param chunk_size: If it's positive, the workbooks are streamed in chunks of `chunk_size` rows,
+               and each chunk is written to `practices_temp` as soon as its columns are derived.
+               Otherwise, each workbook is loaded into memory at once.
+        :param workers: Number of processes used to read the workbooks and compute their derived columns.
+               With more than one worker, each workbook is processed at once by a worker, and `chunk_size` is ignored.
+        :param incremental: Whether to only update the practices of the workbooks that were added, changed or removed
+               since the last import (see `update_practices`). The whole table is rebuilt if the existing table
+               doesn't track the workbook of its practices.
+
+        The time, rows per second and peak memory of each stage of the import are written to
+        `logs/import_report.json` (see `ImportReport`).
+        """
+        with ImportReport(
+            "import_practices",
+            self.profile_imports,
+            files=[os.path.basename(path) for path in practices_paths],
+            chunk_size=chunk_size,
+            workers=workers,
+            incremental=incremental,
+        ).run() as report:
+            practice_reductions = self.get_practice_reductions()
+            report.details["reductions_sha256"] = practice_reductions.fingerprint
+
+            if incremental:
+                practice_sources = self.get_practice_sources()
+                if practice_sources is not None:
+                    report.details["mode"] = "update"
+                    self.update_practices(
+                        practice_reductions,
+                        practices_paths,
+                        practice_sources,
+                        chunk_size,
+                        workers,
+                    )
+                    return
+
+            report.details["mode"] = "full"
+
+            # Imports before `swap_tables` left the index of `practices_temp` on `practices` with its old name
+            self.engine.execute("DROP INDEX IF EXISTS ix_practices_temp_id")
+
+            practices_counts, missing_huc8 = self.write_practices(
+                practice_reductions,
+                practices_paths,
+                "practices_temp",
+                chunk_size,
+                workers,
+            )
+            with stage("build_indexes"):
+                self.engine.execute(
+                    "CREATE UNIQUE INDEX ix_practices_temp_source ON practices_temp (source_file, source_row)"
                 )
+            self.create_practices_indexes("practices_temp")
+            self.write_missing_huc8(missing_huc8)
 
-            else:
-                sunset.append(None)
-                active_year.append(None)
-                category.append(None)
-                wq_benefits.append(None)
-                area_treated.append(None)
-                ancillary_benefits.append(None)
-                p_reduction_fraction.append(None)
-                n_reduction_fraction.append(None)
-                p_reduction_percentage_statewide.append(None)
-                n_reduction_percentage_statewide.append(None)
-                p_reduction_gom_lbs.append(None)
-                n_reduction_gom_lbs.append(None)
-
-        calculated_columns = pd.DataFrame(
-            {
-                "sunset": sunset,
-                "active_year": active_year,
-                "category": category,
-                "wq_benefits": wq_benefits,
-                "area_treated": area_treated,
-                "ancillary_benefits": ancillary_benefits,
-                "p_reduction_fraction": p_reduction_fraction,
-                "n_reduction_fraction": n_reduction_fraction,
-                "p_reduction_percentage_statewide": p_reduction_percentage_statewide,
-                "n_reduction_percentage_statewide": n_reduction_percentage_statewide,
-                "p_reduction_gom_lbs": p_reduction_gom_lbs,
-                "n_reduction_gom_lbs": n_reduction_gom_lbs,
-            }
+            self.write_table(
+                self.practice_sources_frame(
+                    practices_paths, practices_counts, practice_reductions
+                ),
+                "practice_sources_temp",
+                if_exists="replace",
+            )
+            with self.engine.begin() as connection:
+                self.build_rollups(connection, "practices_temp", "_temp")
+            self.swap_tables(
+                "practices", "practice_sources", *[rollup.name for rollup in ROLLUPS]
+            )
+
+    def update_practices(
+        self,
+        practice_reductions: PracticeReductions,
+        practices_paths: List[str],
+        practice_sources: pd.DataFrame,
+        chunk_size: int = 0,
+        workers: int = 1,
+    ):
+        """
+        Updates the `practices` table with the workbooks whose content (or the assumptions used to derive
+        their columns) changed since they were imported, and deletes the practices of the workbooks
+        that are not in `practices_paths` anymore.
+
+        The practices of a changed workbook are upserted by their file name and row number,
+        so unchanged rows keep their ids, and the rows past the new end of the workbook are deleted.
+        """
+        # Each workbook is only read once to hash it, the digests of the changed ones are written with them
+        digests = {}
+        changed_paths = []
+        for practices_path in practices_paths:
+            source_file = os.path.basename(practices_path)
+            digests[practices_path] = self.hash_file(practices_path)
+            if (
+                source_file not in practice_sources.index
+                or practice_sources.loc[source_file, "sha256"]
+                != digests[practices_path]
+                or practice_sources.loc[source_file, "reductions_sha256"]
+                != practice_reductions.fingerprint
+            ):
+                changed_paths.append(practices_path)
+        changed_files = [os.path.basename(path) for path in changed_paths]
+        removed_files = list(
+            set(practice_sources.index)
+            - {os.path.basename(path) for path in practices_paths}
         )
-        calculated_columns.index += 1
 
-        if not os.path.exists("./logs"):
-            os.makedirs("./logs")
-        with open("./logs/missing_huc8.json", "w+") as f:
+        if not changed_files and not removed_files:
+            print("Practices are up to date")
+            return
+
+        print(
+            f"Updating practices of {changed_files} and deleting practices of {removed_files}..."
+        )
+        practices_counts = {}
+        if changed_paths:
+            practices_counts, missing_huc8 = self.write_practices(
+                practice_reductions,
+                changed_paths,
+                "practices_delta",
+                chunk_size,
+                workers,
+            )
+            self.write_missing_huc8(missing_huc8)
+
+        columns = list(PRACTICES_SQL_DTYPE)
+        with stage("upsert_practices"), self.engine.begin() as connection:
+            connection.execute(
+                sqlalchemy.text(
+                    "DELETE FROM practices WHERE source_file = ANY(:source_files)"
+                ),
+                source_files=removed_files,
+            )
+            if changed_paths:
+                connection.execute(
+                    sqlalchemy.text(
+                        """
+                        DELETE FROM practices
+                        WHERE source_file = ANY(:source_files)
+                          AND NOT EXISTS (
+                              SELECT 1 FROM practices_delta
+                              WHERE practices_delta.source_file = practices.source_file
+                                AND practices_delta.source_row = practices.source_row
+                          )
+                        """
+                    ),
+                    source_files=changed_files,
+                )
+                connection.execute(
+                    f"""
+                    INSERT INTO practices (id, {", ".join(columns)})
+                    SELECT
+                        COALESCE(
+                            practices.id,
+                            max_id.id + row_number() OVER (
+                                ORDER BY practices_delta.source_file, practices_delta.source_row
+                            )
+                        ),
+                        {", ".join(f"practices_delta.{column}" for column in columns)}
+                    FROM practices_delta
+                    LEFT JOIN practices USING (source_file, source_row)
+                    CROSS JOIN (SELECT COALESCE(max(id), 0) AS id FROM practices) AS max_id
+                    ON CONFLICT (source_file, source_row) DO UPDATE
+                    SET {", ".join(f"{column} = EXCLUDED.{column}" for column in columns)}
+                    """
+                )
+                connection.execute("DROP TABLE practices_delta")
+
+            connection.execute(
+                sqlalchemy.text(
+                    "DELETE FROM practice_sources WHERE source_file = ANY(:source_files)"
+                ),
+                source_files=removed_files + changed_files,
+            )
+            self.practice_sources_frame(
+                changed_paths, practices_counts, practice_reductions, digests
+            ).to_sql("practice_sources", con=connection, if_exists="append")
+
+            # Rebuilt in the same transaction, so the rollups never disagree with the practices
+            self.build_rollups(connection, "practices")
+            self.bump_data_version(connection)
+        with stage("analyze"):
+            self.engine.execute("ANALYZE practices")
+
+    @staticmethod
+    def write_missing_huc8(missing_huc8: Set[str]):
+        if not os.path.exists(LOGS_DIR):
+            os.makedirs(LOGS_DIR)
+        with open(os.path.join(LOGS_DIR, "missing_huc8.json"), "w+") as f:
             f.write(json.dumps(list(missing_huc8), indent=2))
 
-        print("Importing practices...")
-        self.engine.execute("DROP INDEX IF EXISTS ix_practices_temp_id")
 
-        all_practices.merge(
-            calculated_columns,
-            left_index=True,
-            right_index=True,
-        ).to_sql(
-            "practices_temp",
-            con=self.engine,
-            index_label="id",
-            dtype={
-                "ancillary_benefits": sqlalchemy.types.JSON,
-                "active_year": sqlalchemy.BIGINT,
-            },
-            if_exists="append",
-        )
+# The reductions used by the processes that derive the practice columns in parallel (see `Database.derive_practices`)
+_worker_practice_reductions: Optional[PracticeReductions] = None
 
-        self.engine.execute("DROP TABLE IF EXISTS practices")
-        self.engine.execute("ALTER TABLE practices_temp RENAME TO practices")
+
+def _init_practices_worker(practice_reductions: PracticeReductions):
+    global _worker_practice_reductions
+    _worker_practice_reductions = practice_reductions
+
+
+def _derive_practices_file(
+    practices_path: str,
+) -> Tuple[str, pd.DataFrame, Set[str], float, Dict[str, Stage]]:
+    start = time.perf_counter()
+    # The stages measured in the worker are added to the report of the import by the main process
+    with ImportReport("derive_practices").activate() as report:
+        practices = Database.read_practices(practices_path)
+        with stage("derive_columns") as derive:
+            calculated_columns, missing_huc8 = _worker_practice_reductions.compute(
+                practices
+            )
+            derive.rows = len(practices)
+    return (
+        practices_path,
+        practices.join(calculated_columns),
+        missing_huc8,
+        time.perf_counter() - start,
+        report.stages,
+    )
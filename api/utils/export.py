@@ -0,0 +1,112 @@
+import io
+from typing import Callable, Iterator, List, Optional
+
+import orjson
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.parquet
+from flask import Response, stream_with_context
+from sqlalchemy import JSON, Boolean, Float, Integer, Numeric
+from sqlalchemy.orm import Query
+from sqlalchemy.sql.elements import ColumnElement
+from utils.serializers import GeoJSON
+
+# Number of rows of each record batch (and Parquet row group)
+EXPORT_BATCH_SIZE = 50000
+
+# The media type and file extension of each export format
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "csv": ("text/csv", "csv"),
+}
+
+
+def arrow_field(column: ColumnElement) -> pa.Field:
+    """:return: The arrow field of a column. JSON columns are exported as JSON text."""
+    column_type = column.type
+    if isinstance(column_type, Boolean):
+        arrow_type = pa.bool_()
+    elif isinstance(column_type, Integer):
+        arrow_type = pa.int64()
+    elif isinstance(column_type, (Float, Numeric)):
+        arrow_type = pa.float64()
+    else:
+        arrow_type = pa.string()
+    return pa.field(column.key, arrow_type)
+
+
+def value_converter(column: ColumnElement) -> Optional[Callable]:
+    if isinstance(column.type, (JSON, GeoJSON)):
+        return lambda value: None if value is None else orjson.dumps(value).decode()
+    return None
+
+
+def record_batches(
+    query: Query, columns: List[ColumnElement], schema: pa.Schema
+) -> Iterator[pa.RecordBatch]:
+    """Yields the rows of a query from a server side cursor in record batches of `EXPORT_BATCH_SIZE` rows."""
+    converters = [value_converter(column) for column in columns]
+
+    def to_record_batch(rows: List[tuple]) -> pa.RecordBatch:
+        return pa.record_batch(
+            [
+                pa.array(
+                    list(map(converter, values)) if converter else values,
+                    type=field.type,
+                )
+                for values, field, converter in zip(zip(*rows), schema, converters)
+            ],
+            schema=schema,
+        )
+
+    rows = []
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        rows.append(row)
+        if len(rows) == EXPORT_BATCH_SIZE:
+            yield to_record_batch(rows)
+            rows = []
+    if rows:
+        yield to_record_batch(rows)
+
+
+def export(
+    query: Query, columns: List[ColumnElement], export_format: str, name: str
+) -> Response:
+    """
+    :param export_format: One of `EXPORT_FORMATS`.
+    :param name: Name of the exported file, without extension.
+    :return: A response that streams the results of a query in a columnar format as they are fetched.
+    """
+    (media_type, extension) = EXPORT_FORMATS[export_format]
+    schema = pa.schema([arrow_field(column) for column in columns])
+
+    def generate():
+        sink = io.BytesIO()
+        if export_format == "parquet":
+            writer = pyarrow.parquet.ParquetWriter(sink, schema)
+        elif export_format == "arrow":
+            writer = pa.ipc.new_stream(sink, schema)
+        else:
+            writer = pyarrow.csv.CSVWriter(sink, schema)
+
+        def flush() -> bytes:
+            data = sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+            return data
+
+        for record_batch in record_batches(query, columns, schema):
+            if export_format == "parquet":
+                writer.write_table(pa.Table.from_batches([record_batch]))
+            else:
+                writer.write_batch(record_batch)
+            yield flush()
+        writer.close()
+        yield flush()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'},
+    )
@@ -0,0 +1,357 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from flask import Flask, Response, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the buckets of the latency histograms
+HISTOGRAM_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    float("inf"),
+)
+
+# The query parameters that don't change the queries of a request, only their page or output format
+PAGINATION_PARAMETERS = ("page", "limit", "cursor", "count", "format")
+
+# The query parameters whose values are part of the shape of a request. Only the names of the other ones are.
+STRUCTURE_PARAMETERS = ("fields", "group_by", "aggregates", "partitions", "order_by")
+
+# Maximum number of request shapes and SQL fingerprints with metrics, so they use a bounded amount of memory
+MAX_SERIES = 1000
+
+# Number of slow queries whose plans are kept
+SLOW_QUERIES_SIZE = 50
+
+PLACEHOLDER = r"(?:%\(\w+\)s|%s|\?)"
+PLACEHOLDER_LIST = re.compile(rf"\(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})*\s*\)")
+
+
+class Histogram:
+    """A latency histogram with the `HISTOGRAM_BUCKETS`."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(HISTOGRAM_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect_left(HISTOGRAM_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def to_dict(self) -> dict:
+        """:return: The histogram with cumulative buckets, like the histograms of Prometheus."""
+        buckets = {}
+        cumulative_count = 0
+        for bound, bucket_count in zip(HISTOGRAM_BUCKETS, self.bucket_counts):
+            cumulative_count += bucket_count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative_count
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class RequestProfile:
+    """The time spent in each phase of a request, and the SQL statements that it ran."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # The phases of a request can run in several threads (see `query.run_concurrently`)
+        self.lock = threading.Lock()
+        self.phases: Dict[str, float] = defaultdict(float)
+        self.statements: List[dict] = []
+
+    def add_phase(self, name: str, seconds: float):
+        with self.lock:
+            self.phases[name] += seconds
+
+    def add_statement(
+        self,
+        fingerprint: str,
+        phase: Optional[str],
+        seconds: float,
+        rows: Optional[int],
+    ):
+        with self.lock:
+            self.statements.append(
+                {
+                    "fingerprint": fingerprint,
+                    "phase": phase,
+                    "seconds": seconds,
+                    "rows": rows,
+                }
+            )
+
+
+_profile: ContextVar[Optional[RequestProfile]] = ContextVar("profile", default=None)
+_phase: ContextVar[Optional[str]] = ContextVar("phase", default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """:return: The profile of the request handled by the current thread, if it's profiled."""
+    return _profile.get()
+
+
+@contextmanager
+def profiling(profile: Optional[RequestProfile]) -> Iterator[None]:
+    """Adds the phases and statements of the current thread to `profile`, e.g. in the threads of a request."""
+    token = _profile.set(profile)
+    try:
+        yield
+    finally:
+        _profile.reset(token)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Measures a phase of the current request, e.g. `count` or `fetch`, and labels its SQL statements with it."""
+    profile = _profile.get()
+    if profile is None:
+        yield
+        return
+    token = _phase.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_phase(name, time.perf_counter() - start)
+        _phase.reset(token)
+
+
+@lru_cache(maxsize=1024)
+def fingerprint_statement(statement: str) -> Tuple[str, str]:
+    """
+    :return: The fingerprint of a SQL statement and its normalized SQL. The SQL is normalized by collapsing
+             the lists of parameters (e.g. of `IN` filters), so it doesn't depend on the number of values.
+    """
+    sql = " ".join(PLACEHOLDER_LIST.sub("(?)", statement).split())
+    return hashlib.sha1(sql.encode()).hexdigest()[:16], sql
+
+
+class Instrumentation:
+    """
+    Measures the requests to a Flask app and the SQL statements of an engine, in the current process.
+
+    Each request is timed as a whole and by phase: `compile` (building the query), `count`, `fetch`
+    and `serialize`. The phases can overlap, since the exact count and the page of a search are fetched
+    at the same time.
+    The timings are returned in the `Server-Timing` header of the responses, and aggregated in histograms
+    by endpoint and request shape: the names of the filter parameters, and the values of the parameters
+    that change the structure of the query (e.g. `group_by`).
+
+    Each SQL statement is aggregated by its fingerprint. The plans of the statements slower than
+    `slow_query_seconds` are captured with `EXPLAIN (ANALYZE, BUFFERS)`, which runs them again.
+    """
+
+    def __init__(self, slow_query_seconds: float = 0):
+        """:param slow_query_seconds: Duration above which the plans of the queries are captured, 0 to disable it."""
+        self.slow_query_seconds = slow_query_seconds
+        self.lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str], Dict[str, Histogram]] = {}
+        self.statements: Dict[str, dict] = {}
+        self.slow_queries = deque(maxlen=SLOW_QUERIES_SIZE)
+
+    def init_app(self, app: Flask):
+        """Measures the requests of an app. It should be initialized before the extensions that answer requests."""
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+        app.teardown_request(self.teardown_request)
+
+    def instrument(self, engine: Engine):
+        """Measures the SQL statements of an engine."""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(
+            connection, cursor, statement, parameters, context, executemany
+        ):
+            connection.info["query_start"] = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(
+            connection, cursor, statement, parameters, context, executemany
+        ):
+            seconds = time.perf_counter() - connection.info["query_start"]
+            self.record_statement(
+                connection, cursor, statement, parameters, context, seconds
+            )
+
+    @staticmethod
+    def start_request():
+        _profile.set(RequestProfile())
+
+    @staticmethod
+    def teardown_request(exception=None):
+        _profile.set(None)
+
+    @staticmethod
+    def request_shape() -> str:
+        """:return: The names of the filter parameters of the request and the values of its `STRUCTURE_PARAMETERS`."""
+        parameters = defaultdict(list)
+        for name, value in parse_qsl(
+            request.query_string.decode(), keep_blank_values=True
+        ):
+            if name in STRUCTURE_PARAMETERS:
+                parameters[name].append(value)
+            elif name not in PAGINATION_PARAMETERS:
+                parameters[name] = []
+        return "&".join(
+            f"{name}={','.join(values)}" if values else name
+            for name, values in sorted(parameters.items())
+        )
+
+    def end_request(self, response: Response) -> Response:
+        profile = _profile.get()
+        # Requests that don't match a route (e.g. 404) are not measured
+        if profile is None or request.url_rule is None:
+            return response
+        total = time.perf_counter() - profile.start
+        phases = {**profile.phases, "total": total}
+
+        key = (request.url_rule.rule, self.request_shape())
+        with self.lock:
+            if key not in self.requests and len(self.requests) >= MAX_SERIES:
+                key = (key[0], "other")
+            histograms = self.requests.setdefault(key, defaultdict(Histogram))
+            for name, seconds in phases.items():
+                histograms[name].observe(seconds)
+
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={seconds * 1000:.1f}" for name, seconds in phases.items()
+        )
+        logger.debug(
+            "%s %s %s statements=%s",
+            request.method,
+            request.full_path,
+            " ".join(f"{name}={seconds:.4f}s" for name, seconds in phases.items()),
+            profile.statements,
+        )
+        return response
+
+    def record_statement(
+        self, connection, cursor, statement, parameters, context, seconds: float
+    ):
+        (fingerprint, sql) = fingerprint_statement(statement)
+        # The number of rows of a server side cursor is not known until they are fetched
+        rows = cursor.rowcount if cursor.rowcount >= 0 else None
+
+        with self.lock:
+            statement_metrics = self.statements.get(fingerprint)
+            if statement_metrics is None and len(self.statements) < MAX_SERIES:
+                statement_metrics = self.statements[fingerprint] = {
+                    "sql": sql,
+                    "calls": 0,
+                    "rows_total": 0,
+                    "seconds_total": 0.0,
+                    "seconds_max": 0.0,
+                    "histogram": Histogram(),
+                }
+            if statement_metrics is not None:
+                statement_metrics["calls"] += 1
+                statement_metrics["rows_total"] += rows or 0
+                statement_metrics["seconds_total"] += seconds
+                statement_metrics["seconds_max"] = max(
+                    statement_metrics["seconds_max"], seconds
+                )
+                statement_metrics["histogram"].observe(seconds)
+
+        profile = _profile.get()
+        if profile is not None:
+            profile.add_statement(fingerprint, _phase.get(), seconds, rows)
+
+        if 0 < self.slow_query_seconds <= seconds:
+            logger.warning("Slow query %s took %.3fs: %s", fingerprint, seconds, sql)
+            plan = None
+            if (
+                connection.dialect.name == "postgresql"
+                and not context.execution_options.get("stream_results")
+                and sql.upper().startswith(("SELECT", "WITH"))
+            ):
+                plan = self.explain(connection, statement, parameters)
+            self.slow_queries.append(
+                {
+                    "fingerprint": fingerprint,
+                    "sql": sql,
+                    "seconds": seconds,
+                    "path": request.full_path if has_request_context() else None,
+                    "captured_at": datetime.now(timezone.utc).isoformat(),
+                    "plan": plan,
+                }
+            )
+
+    @staticmethod
+    def explain(connection, statement, parameters) -> Optional[list]:
+        """
+        :return: The plan of a statement from `EXPLAIN (ANALYZE, BUFFERS)`. It runs in a savepoint of the transaction
+                 of the statement, so an error doesn't abort the transaction.
+        """
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute("SAVEPOINT explain_slow_query")
+            try:
+                cursor.execute(
+                    f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters
+                )
+                ((plan,),) = cursor.fetchall()
+                cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+                return plan
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+                raise
+        except Exception:
+            logger.exception("Couldn't explain the slow query")
+            return None
+        finally:
+            cursor.close()
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "requests": [
+                    {
+                        "endpoint": endpoint,
+                        "shape": shape,
+                        "phases": {
+                            name: histogram.to_dict()
+                            for name, histogram in histograms.items()
+                        },
+                    }
+                    for (endpoint, shape), histograms in self.requests.items()
+                ],
+                "statements": sorted(
+                    (
+                        {
+                            "fingerprint": fingerprint,
+                            **statement_metrics,
+                            "seconds_mean": statement_metrics["seconds_total"]
+                            / statement_metrics["calls"],
+                            "histogram": statement_metrics["histogram"].to_dict(),
+                        }
+                        for fingerprint, statement_metrics in self.statements.items()
+                    ),
+                    key=lambda statement_metrics: statement_metrics["seconds_total"],
+                    reverse=True,
+                ),
+                "slow_queries": list(self.slow_queries),
+            }
@@ -0,0 +1,215 @@
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Sized, TypeVar
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Where the import reports are written, with `missing_huc8.json`
+LOGS_DIR = "./logs"
+
+T = TypeVar("T", bound=Sized)
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    :param children: Whether to get the peak of the terminated child processes (e.g. the import workers)
+           instead of the current process.
+    :return: The maximum resident set size in MB so far, or None if it can't be measured.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(
+        resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    )
+    # In bytes on macOS and in KB on Linux
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Stage:
+    """The time spent in a stage of an import and the rows that it processed, over all its calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.peak_rss_mb: Optional[float] = None
+
+    def merge(self, other: "Stage"):
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.rows += other.rows
+        if other.peak_rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0, other.peak_rss_mb)
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "rows": self.rows,
+            "rows_per_second": self.rows / self.seconds
+            if self.rows and self.seconds
+            else None,
+            "peak_rss_mb": self.peak_rss_mb,
+        }
+
+
+_report: ContextVar[Optional["ImportReport"]] = ContextVar(
+    "import_report", default=None
+)
+
+
+class ImportReport:
+    """
+    Measures the stages of an import, e.g. reading the workbooks, deriving the practice columns or writing a table.
+    The report of each run is written to `LOGS_DIR/import_report.json` and appended to `import_reports.jsonl`,
+    to compare the runs over time.
+
+    The peak RSS of a stage is the peak of the process when the stage ended, so the stage that raised it
+    can be told by comparing it to the previous stages.
+    """
+
+    def __init__(self, command: str, profile: bool = False, **details: Any):
+        """
+        :param command: The name of the import, e.g. `import_practices`.
+        :param profile: Whether to profile the run with cProfile, and write the stats to `LOGS_DIR`.
+               They can be read with `pstats` or viewers like snakeviz.
+        :param details: Parameters of the run written with the report.
+        """
+        self.command = command
+        self.profile = profile
+        self.details = details
+        self.stages: Dict[str, Stage] = {}
+        self.started_at = datetime.now()
+        self.seconds = 0.0
+        self.error: Optional[str] = None
+        self.profile_path: Optional[str] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Stage]:
+        """Measures a call of a stage. The rows that it processed can be added to the yielded stage."""
+        call = Stage()
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            call.calls = 1
+            call.seconds = time.perf_counter() - start
+            call.peak_rss_mb = peak_rss_mb()
+            self.stages.setdefault(name, Stage()).merge(call)
+
+    def merge(self, stages: Dict[str, Stage]):
+        """Adds the stages measured in another process."""
+        for name, stage in stages.items():
+            self.stages.setdefault(name, Stage()).merge(stage)
+
+    @contextmanager
+    def activate(self) -> Iterator["ImportReport"]:
+        """Adds the stages measured in the current thread to the report (see `stage`)."""
+        token = _report.set(self)
+        try:
+            yield self
+        finally:
+            _report.reset(token)
+
+    @contextmanager
+    def run(self) -> Iterator["ImportReport"]:
+        """Measures the stages of the run in the current thread (see `stage`), and writes the report at the end."""
+        profiler = cProfile.Profile() if self.profile else None
+        start = time.perf_counter()
+        try:
+            with self.activate():
+                if profiler:
+                    profiler.enable()
+                try:
+                    yield self
+                finally:
+                    if profiler:
+                        profiler.disable()
+        except BaseException as e:
+            self.error = repr(e)
+            raise
+        finally:
+            self.seconds = time.perf_counter() - start
+            if profiler:
+                os.makedirs(LOGS_DIR, exist_ok=True)
+                self.profile_path = os.path.join(
+                    LOGS_DIR, f"{self.command}_{self.started_at:%Y%m%d_%H%M%S}.prof"
+                )
+                profiler.dump_stats(self.profile_path)
+            self.write()
+
+    def to_dict(self) -> dict:
+        return {
+            "command": self.command,
+            "started_at": self.started_at.isoformat(),
+            "seconds": self.seconds,
+            "error": self.error,
+            "peak_rss_mb": peak_rss_mb(),
+            "workers_peak_rss_mb": peak_rss_mb(children=True),
+            "profile": self.profile_path,
+            **self.details,
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+        }
+
+    def write(self):
+        report = self.to_dict()
+        os.makedirs(LOGS_DIR, exist_ok=True)
+        with open(os.path.join(LOGS_DIR, "import_report.json"), "w") as f:
+            f.write(json.dumps(report, indent=2))
+        with open(os.path.join(LOGS_DIR, "import_reports.jsonl"), "a") as f:
+            f.write(json.dumps(report) + "\n")
+
+        print(f"{self.command} took {self.seconds:.2f}s")
+        for name, stage in report["stages"].items():
+            rows_per_second = (
+                f", {stage['rows_per_second']:.0f} rows/sec"
+                if stage["rows_per_second"]
+                else ""
+            )
+            print(
+                f"  {name}: {stage['seconds']:.2f}s in {stage['calls']} calls{rows_per_second}, "
+                f"peak RSS {stage['peak_rss_mb'] or 0:.0f} MB"
+            )
+
+
+@contextmanager
+def stage(name: str) -> Iterator[Stage]:
+    """
+    Measures a stage of the import run of the current thread, if there is one (see `ImportReport.run`).
+    Stages can be nested, e.g. `clean_columns` is part of reading the workbooks.
+    """
+    report = _report.get()
+    if report is None:
+        yield Stage()
+        return
+    with report.stage(name) as call:
+        yield call
+
+
+def iterate_stage(name: str, items: Iterable[T]) -> Iterator[T]:
+    """Yields the items of an iterable, measuring the production of each of them (e.g. a chunk) as a stage."""
+    iterator = iter(items)
+    while True:
+        with stage(name) as call:
+            item = next(iterator, None)
+            if item is not None:
+                call.rows = len(item)
+        if item is None:
+            return
+        yield item
+
+
+def merge_stages(stages: Dict[str, Stage]):
+    """Adds the stages measured in another process to the import run of the current thread, if there is one."""
+    report = _report.get()
+    if report is not None:
+        report.merge(stages)
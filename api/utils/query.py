@@ -1,12 +1,43 @@
+import base64
+import binascii
+import json
 import math
 import re
-from typing import Any, Iterable, List, Optional, Tuple, TypedDict, Union, cast
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypedDict,
+    Union,
+    cast,
+)
 
 from connexion import request
-from sqlalchemy import and_, asc, desc, func, or_
+from sqlalchemy import (
+    BigInteger,
+    and_,
+    asc,
+    desc,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+    tuple_,
+    union_all,
+)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Query, Session
 from sqlalchemy.orm.attributes import InstrumentedAttribute
-from sqlalchemy.sql.elements import BinaryExpression
-from utils import db
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import BinaryExpression, ClauseElement, ColumnElement
+from utils import db, instrumentation, rollups, serializers
+from werkzeug.exceptions import BadRequest
 
 ColumnName = str  # The column name in the model
 Expression = str  # The sql expression to apply on the column
@@ -16,13 +47,39 @@ QueryFilterConfig = Union[
 ]
 
 
+# Ways of counting the results of a search: the exact count, the row estimate of the query planner, or no count
+COUNT_MODES = ("exact", "estimate", "none")
+
+# Number of rows fetched at once from the server side cursor of `stream`
+STREAM_BATCH_SIZE = 2000
+
+# Number of threads of each process that count the results of searches while their page is fetched.
+# Each of them holds a connection of the count engine of the session while it runs (see `Database.count_engine`).
+COUNT_THREADS = db.COUNT_POOL_SIZE
+
+# The threads of `run_concurrently`, shared by the requests of the process
+COUNT_EXECUTOR = ThreadPoolExecutor(COUNT_THREADS, thread_name_prefix="count")
+
+# The years of the series of `active_years`, which bound its number of results
+ACTIVE_YEARS_RANGE = (1900, 2200)
+
+
 class SearchResults(TypedDict):
-    count: int
+    count: Optional[int]
     first: str
-    last: str
+    last: Optional[str]
     previous: Optional[str]
     next: Optional[str]
-    results: Iterable[db.Base]
+    results: Iterable[dict]
+
+
+def get_filter_columns(query_filter_config: QueryFilterConfig) -> Iterator[ColumnName]:
+    """:return: The names of the columns used in a filter config."""
+    if len(query_filter_config) == 2:
+        for sub_filter in cast(Iterable[QueryFilterConfig], query_filter_config[1]):
+            yield from get_filter_columns(sub_filter)
+    elif len(query_filter_config) == 3:
+        yield query_filter_config[0]
 
 
 def process_query_filters(
@@ -38,69 +95,260 @@ def process_query_filters(
         return getattr(getattr(model, key), op)(value)
 
 
-def get(model: db.Base, query_id: Union[str, int]) -> db.Base:
-    return model.query.get(query_id)
+class Explain(Executable, ClauseElement):
+    """The `EXPLAIN` of a statement."""
 
+    inherit_cache = False
 
-def search(
+    def __init__(self, statement: ClauseElement, options: str = "FORMAT JSON"):
+        self.statement = statement
+        self.options = options
+
+
+@compiles(Explain, "postgresql")
+def compile_explain(element: Explain, compiler, **kwargs) -> str:
+    return (
+        f"EXPLAIN ({element.options}) {compiler.process(element.statement, **kwargs)}"
+    )
+
+
+def estimate_count(query: Query) -> int:
+    """:return: The number of rows of the query estimated by the query planner, without running the query."""
+    ((plan,),) = query.session.execute(Explain(query.statement)).all()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def run_concurrently(query: Query, *functions: Callable[[Query], Any]) -> List[Any]:
+    """
+    Runs functions of a query at the same time, e.g. to count the results while a page is fetched.
+    The first function runs in the current thread and session. The other ones run in the `COUNT_EXECUTOR` threads
+    with their own session, bound to the `count_bind` of the session info if it has one (see `Database`).
+    Its connections are not shared with the requests, which hold theirs while they wait for the other functions,
+    so these can't wait for each other even when every connection of the requests is in use.
+    The functions wait for a thread when all of them are busy. With gevent workers, the threads are greenlets.
+
+    The functions run in different transactions, so they can see different snapshots of the data,
+    e.g. a count of the practices before an import and a page of the practices after it.
+    This is accepted for the counts of searches, which are only used for the number of pages.
+
+    :return: The results of the functions, in the same order.
+    """
+
+    # The threads measure the phases of the request of the current thread
+    profile = instrumentation.current_profile()
+
+    bind = query.session.info.get("count_bind") or query.session.get_bind()
+
+    def run_in_new_session(function: Callable[[Query], Any]) -> Any:
+        with instrumentation.profiling(profile), Session(bind) as session:
+            return function(query.with_session(session))
+
+    futures = [
+        COUNT_EXECUTOR.submit(run_in_new_session, function)
+        for function in functions[1:]
+    ]
+    return [functions[0](query), *(future.result() for future in futures)]
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """:return: An opaque token of the keyset values of a row."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """:return: The keyset values of a cursor token."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BadRequest("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise BadRequest("Invalid cursor")
+    return values
+
+
+def is_nullable(column: ColumnElement) -> bool:
+    """:return: Whether a column, e.g. an attribute of a model, can have null values."""
+    return getattr(getattr(column, "expression", column), "nullable", True)
+
+
+def keyset_filter(
+    keyset: List[Tuple[ColumnElement, bool]], values: List[Any]
+) -> ColumnElement:
+    """
+    :param keyset: The columns that the rows are ordered by, and whether each of them is in descending order.
+    :param values: The values of the columns in the last row of the previous page.
+    :return: A filter of the rows after the last row of the previous page.
+             Nulls are sorted as in PostgreSQL, i.e. last in ascending order and first in descending order.
+
+    The filter is written so PostgreSQL can start an index scan at the last row, e.g. `id > 42` instead of
+    `id > 42 OR id IS NULL`: nulls are only handled for nullable columns, the columns before the last one are
+    compared with `=`, and columns without nulls in the same direction are compared as a row, e.g.
+    `(applied_date, id) > (2010, 42)`.
+    """
+    if all(not is_nullable(column) for column, _ in keyset) and (
+        len({descending for _, descending in keyset}) == 1
+    ):
+        (columns, row) = (
+            (keyset[0][0], values[0])
+            if len(keyset) == 1
+            else (tuple_(*(column for column, _ in keyset)), tuple_(*values))
+        )
+        return columns < row if keyset[0][1] else columns > row
+
+    conditions = []
+    for i, ((column, descending), value) in enumerate(zip(keyset, values)):
+        if value is None:
+            after = column.isnot(None) if descending else None
+        elif descending:
+            after = column < value
+        elif is_nullable(column):
+            after = or_(column > value, column.is_(None))
+        else:
+            after = column > value
+        if after is not None:
+            conditions.append(
+                and_(
+                    *[
+                        previous_column.is_(None)
+                        if previous_value is None
+                        else previous_column == previous_value
+                        for (previous_column, _), previous_value in zip(
+                            keyset[:i], values[:i]
+                        )
+                    ],
+                    after,
+                )
+            )
+    return or_(*conditions) if conditions else ~true()
+
+
+def select_fields(
+    columns: List[ColumnElement], fields: Iterable[str]
+) -> List[ColumnElement]:
+    """
+    :param fields: The names of the columns to return, all of them if it's empty.
+    :return: The columns named in `fields`, in their order in `columns`.
+    """
+    fields = set(fields)
+    if not fields:
+        return columns
+    column_keys = [column.key for column in columns]
+    invalid_fields = sorted(fields - set(column_keys))
+    if invalid_fields:
+        raise BadRequest(
+            f"Invalid fields {', '.join(invalid_fields)}, the fields are {', '.join(column_keys)}"
+        )
+    return [column for column in columns if column.key in fields]
+
+
+def get(
+    model: db.Base,
+    query_id: Union[str, int],
+    columns: Iterable[ColumnElement] = (),
+    outer_joins: Iterable[Tuple[Any, ColumnElement]] = (),
+    fields: Iterable[str] = (),
+) -> Optional[dict]:
+    """
+    :param columns: Columns returned in addition to the columns of the model, e.g. from the tables of `outer_joins`.
+    :param outer_joins: The tables left outer joined to the model, and their join condition.
+    :param fields: The names of the columns to return, all of them if it's empty.
+    """
+    with instrumentation.phase("compile"):
+        columns = select_fields([*serializers.model_columns(model), *columns], fields)
+        query = model.query.session.query(*columns).select_from(model)
+        for target, on_clause in outer_joins:
+            query = query.outerjoin(target, on_clause)
+        query = query.filter(model.__mapper__.primary_key[0] == query_id)
+    with instrumentation.phase("fetch"):
+        row = query.first()
+    return dict(zip([column.key for column in columns], row)) if row else None
+
+
+def search_query(
     model: db.Base,
-    page: int,
-    limit: int,
     query_filters_config: Iterable[QueryFilterConfig] = (),
     columns: Iterable[InstrumentedAttribute] = (),
+    fields: Iterable[str] = (),
     group_by: Iterable[str] = (),
     aggregates: Iterable[str] = (),
     partitions: Iterable[str] = (),
     partition_size: int = 0,
     order_by: Iterable[str] = (),
-) -> SearchResults:
+    keyset: bool = False,
+) -> Tuple[Query, List[ColumnElement], List[Tuple[str, ColumnElement, bool]]]:
     """
-    :param model: A SQLAlchemy model.
-    :param page: The page number in the query result.
-    :param limit: Number of items per page.
-                  If limit is less than 1, then all the items matching the query will be returned.
-    :param query_filters_config: An iterable of filters to apply to the query
-           (see `QueryFilterConfig` for the structure of the iterable items).
-    :param columns: List of columns to include in the query results. If it's empty, then all columns will be included.
-    :param group_by: List of columns to group the query by.
-    :param aggregates: List of aggregate function to apply to a column. Each item must be a string in the following
-           format: `<column-name>-<aggregate_function>`.
-    :param partitions: List of columns to partition over.
-    :param partition_size: number of items to include in each partition.
-           A non-positive integer means include everything.
-    :param order_by: List of columns to order the query by.
-           Column names must be prepended with + or -, indicating whether to sort them in ascending or descending
-           order respectively.
-    :return a dict object in shape of `SearchResult` type.
+    Builds the query of a search (see `search` for the parameters).
+
+    :param keyset: Whether to add the primary key of the model to the order of the results, for keyset pagination.
+    :return: The query, its columns, and the name, column and direction of the columns that the results are
+             ordered by.
     """
+    query_filters_config = list(query_filters_config)
+    columns = list(columns)
+
+    # `source` is the object that the query columns are taken from
+    source = model
+    rollup = None
+    if (group_by or aggregates) and not columns:
+        rollup = rollups.find_rollup(
+            model.__tablename__,
+            [
+                *(
+                    column_name
+                    for query_filter_config in query_filters_config
+                    for column_name in get_filter_columns(query_filter_config)
+                ),
+                *group_by,
+                *(
+                    column_name
+                    for column_name in [
+                        *partitions,
+                        *(column_order.lstrip("+-") for column_order in order_by),
+                    ]
+                    if column_name not in aggregates
+                ),
+            ],
+            aggregates,
+        )
+        if rollup:
+            source = rollup.table.c
+
     query_filters: List[BinaryExpression] = []
 
     for query_filter_config in query_filters_config:
-        query_filters.append(process_query_filters(model, query_filter_config))
+        query_filters.append(process_query_filters(source, query_filter_config))
 
     session = model.query.session
 
-    columns = list(columns)
     dynamic_columns = {}
 
     if group_by:
-        columns = columns + list(map(lambda c: getattr(model, c), group_by))
+        # The columns of the rollup tables are keyed by a `quoted_name`, which orjson doesn't serialize
+        columns = columns + list(map(lambda c: getattr(source, c).label(c), group_by))
 
     for aggregate in aggregates:
         (column_name, agg_func) = aggregate.split("-")
-        column = getattr(func, agg_func)(getattr(model, column_name))
+        if rollup:
+            column = rollup.aggregate(column_name, agg_func)
+        else:
+            column = getattr(func, agg_func)(getattr(model, column_name))
         columns.append(column.label(aggregate))
         dynamic_columns[aggregate] = column
 
-    if columns:
-        query = session.query(*columns)
-    else:
-        query = session.query(model)
+    if not columns:
+        # Select the columns of the model instead of the model, so the rows don't have to be turned into instances
+        columns = list(serializers.model_columns(model))
+    # The columns that aren't returned are still available to the filters, groups, partitions and order
+    columns = select_fields(columns, fields)
+
+    query = session.query(*columns)
 
     if group_by:
         query = query.group_by(*group_by)
 
     order_by_args = []
+    # The name, column and direction of the columns that the results are ordered by
+    order_columns = []
     if order_by:
         for column_order in order_by:
             if column_order[0] == "-":
@@ -113,9 +361,21 @@ def search(
             if column_name in dynamic_columns:
                 column = dynamic_columns[column_name]
             else:
-                column = getattr(model, column_name)
+                column = getattr(source, column_name)
 
             order_by_args.append(order_func(column))
+            order_columns.append((column_name, column, order_func is desc))
+
+    if keyset:
+        if group_by or aggregates or partitions:
+            raise BadRequest(
+                "Cursor pagination can't be used with group_by, aggregates or partitions"
+            )
+        for primary_key in model.__mapper__.primary_key:
+            name = model.__mapper__.get_property_by_column(primary_key).key
+            if name not in [column_name for column_name, _, _ in order_columns]:
+                order_by_args.append(asc(getattr(model, name)))
+                order_columns.append((name, getattr(model, name), False))
 
     query = query.filter(*query_filters)
 
@@ -125,7 +385,7 @@ def search(
             if column_name in dynamic_columns:
                 partition_columns.append(dynamic_columns[column_name])
             else:
-                partition_columns.append(getattr(model, column_name))
+                partition_columns.append(getattr(source, column_name))
 
         row_number = (
             func.row_number()
@@ -139,10 +399,137 @@ def search(
     else:
         query = query.order_by(*order_by_args)
 
-    count = query.count()
+    return query, columns, order_columns
+
+
+def search(
+    model: db.Base,
+    page: int,
+    limit: int,
+    query_filters_config: Iterable[QueryFilterConfig] = (),
+    columns: Iterable[InstrumentedAttribute] = (),
+    fields: Iterable[str] = (),
+    group_by: Iterable[str] = (),
+    aggregates: Iterable[str] = (),
+    partitions: Iterable[str] = (),
+    partition_size: int = 0,
+    order_by: Iterable[str] = (),
+    cursor: Optional[str] = None,
+    count_mode: str = "exact",
+) -> SearchResults:
+    """
+    :param model: A SQLAlchemy model.
+    :param page: The page number in the query result.
+    :param limit: Number of items per page.
+                  If limit is less than 1, then all the items matching the query will be returned.
+    :param query_filters_config: An iterable of filters to apply to the query
+           (see `QueryFilterConfig` for the structure of the iterable items).
+    :param columns: List of columns to include in the query results. If it's empty, then all columns will be included.
+    :param fields: The names of the columns, groups and aggregates to return, all of them if it's empty.
+    :param group_by: List of columns to group the query by.
+    :param aggregates: List of aggregate function to apply to a column. Each item must be a string in the following
+           format: `<column-name>-<aggregate_function>`.
+    :param partitions: List of columns to partition over.
+    :param partition_size: number of items to include in each partition.
+           A non-positive integer means include everything.
+    :param order_by: List of columns to order the query by.
+           Column names must be prepended with + or -, indicating whether to sort them in ascending or descending
+           order respectively.
+    :param cursor: Use keyset pagination instead of pages. An empty string returns the first page,
+           and the `next` link of each page has the cursor of the following page.
+           The results are ordered by `order_by` and then by the primary key of the model,
+           so the cost of a page doesn't depend on its position. It can't be used with groups or partitions.
+    :param count_mode: One of `COUNT_MODES`. Without the exact count, there isn't a link to the last page.
+    :return a dict object in shape of `SearchResult` type.
+
+    Queries that group and aggregate the model are answered from the smallest rollup of the model
+    (see `utils.rollups`) that has all the columns used by the query.
+    The exact count of the results runs at the same time as the page is fetched (see `run_concurrently`).
+    """
+    with instrumentation.phase("compile"):
+        (query, columns, order_columns) = search_query(
+            model,
+            query_filters_config,
+            columns,
+            fields,
+            group_by,
+            aggregates,
+            partitions,
+            partition_size,
+            order_by,
+            keyset=cursor is not None,
+        )
+
+    def count_results(count_query: Query) -> int:
+        with instrumentation.phase("count"):
+            if count_mode == "exact":
+                return count_query.count()
+            return estimate_count(count_query)
+
+    def fetch(fetch_rows: Callable[[Query], list]) -> Tuple[list, Optional[int]]:
+        """:return: The rows fetched from the query, and the count of the results."""
+
+        def fetch_page(page_query: Query) -> list:
+            with instrumentation.phase("fetch"):
+                return fetch_rows(page_query)
+
+        if count_mode == "none":
+            return fetch_page(query), None
+        if count_mode == "estimate":
+            # The estimate is a quick EXPLAIN, which isn't worth another connection
+            return fetch_page(query), count_results(query)
+        (rows, count) = run_concurrently(query, fetch_page, count_results)
+        return rows, count
+
+    def query_list_to_dict(items):
+        out = {}
+        for i, c in enumerate(columns):
+            out[c.key] = items[i]
+        return out
+
+    if cursor is not None:
+        return search_keyset(
+            query, columns, order_columns, cursor, limit, fetch, query_list_to_dict
+        )
+
+    if count_mode != "exact":
+        if limit < 1:
+            (results, count) = fetch(lambda page_query: page_query.all())
+            has_next = False
+        else:
+            # Fetch one more row to know if there is a next page
+            (results, count) = fetch(
+                lambda page_query: page_query.limit(limit + 1)
+                .offset((page - 1) * limit)
+                .all()
+            )
+            has_next = len(results) > limit
+            results = results[:limit]
+        results = list(map(lambda items: query_list_to_dict(items), results))
+
+        query_params = re.sub(
+            "&$", "", re.sub(r"page=\d+&?", "", request.query_string.decode())
+        )
+        return {
+            "count": count,
+            "first": f"{request.base_url}?page=1&{query_params}",
+            "last": None,
+            "previous": f"{request.base_url}?page={page - 1}&{query_params}"
+            if page > 1
+            else None,
+            "next": f"{request.base_url}?page={page + 1}&{query_params}"
+            if has_next
+            else None,
+            "results": results,
+        }
 
     if limit < 1:
+        (results, count) = fetch(lambda page_query: page_query.all())
         limit = count
+    else:
+        (results, count) = fetch(
+            lambda page_query: page_query.limit(limit).offset((page - 1) * limit).all()
+        )
 
     total_pages = math.ceil(count / limit)
 
@@ -160,15 +547,7 @@ def search(
     if page * limit < count:
         next_url = f"{request.base_url}?page={page + 1}&{query_params}"
 
-    def query_list_to_dict(items):
-        out = {}
-        for i, c in enumerate(columns):
-            out[c.key] = items[i]
-        return out
-
-    results = query.limit(limit).offset((page - 1) * limit).all()
-    if columns:
-        results = list(map(lambda items: query_list_to_dict(items), results))
+    results = list(map(lambda items: query_list_to_dict(items), results))
 
     return {
         "count": count,
@@ -178,3 +557,217 @@ def search(
         "next": next_url,
         "results": results,
     }
+
+
+def stream(
+    model: db.Base,
+    page: int,
+    limit: int,
+    query_filters_config: Iterable[QueryFilterConfig] = (),
+    columns: Iterable[InstrumentedAttribute] = (),
+    fields: Iterable[str] = (),
+    group_by: Iterable[str] = (),
+    aggregates: Iterable[str] = (),
+    partitions: Iterable[str] = (),
+    partition_size: int = 0,
+    order_by: Iterable[str] = (),
+) -> Iterator[List[dict]]:
+    """
+    Like `search`, but yields the results in batches as they are fetched from a server side cursor,
+    so the memory used doesn't depend on the number of results. There is no count or links to other pages.
+    """
+    (query, columns, _) = search_query(
+        model,
+        query_filters_config,
+        columns,
+        fields,
+        group_by,
+        aggregates,
+        partitions,
+        partition_size,
+        order_by,
+    )
+    if limit > 0:
+        query = query.limit(limit).offset((page - 1) * limit)
+
+    keys = [column.key for column in columns]
+    batch = []
+    for row in query.yield_per(STREAM_BATCH_SIZE):
+        batch.append(dict(zip(keys, row)))
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def search_keyset(
+    query: Query,
+    columns: List[InstrumentedAttribute],
+    order_columns: List[Tuple[str, ColumnElement, bool]],
+    cursor: str,
+    limit: int,
+    fetch: Callable[[Callable[[Query], list]], Tuple[list, Optional[int]]],
+    query_list_to_dict,
+) -> SearchResults:
+    """
+    Returns the page of a search after the row of `cursor` (see `search`).
+
+    :param fetch: Fetches rows from the query of the search, and counts its results.
+    """
+    keyset = [(column, descending) for _, column, descending in order_columns]
+    query_filters = []
+    if cursor:
+        query_filters.append(keyset_filter(keyset, decode_cursor(cursor, len(keyset))))
+
+    # The position of each keyset column in the rows, adding the ones that are not in `columns`
+    positions = []
+    extra_columns = []
+    column_keys = [column.key for column in columns]
+    for name, column, _ in order_columns:
+        if name in column_keys:
+            positions.append(column_keys.index(name))
+        else:
+            positions.append(len(columns) + len(extra_columns))
+            extra_columns.append(column)
+
+    def fetch_rows(page_query: Query) -> list:
+        # The results are counted without the keyset filter
+        page_query = page_query.filter(*query_filters)
+        if extra_columns:
+            page_query = page_query.add_columns(*extra_columns)
+        return page_query.limit(limit + 1).all() if limit > 0 else page_query.all()
+
+    (rows, count) = fetch(fetch_rows)
+    has_next = 0 < limit < len(rows)
+    rows = rows[:limit] if limit > 0 else rows
+
+    query_params = re.sub(
+        "^&|&$", "", re.sub(r"(page|cursor)=[^&]*&?", "", request.query_string.decode())
+    )
+    next_url = None
+    if has_next:
+        values = [rows[-1][position] for position in positions]
+        next_url = f"{request.base_url}?cursor={encode_cursor(values)}&{query_params}"
+
+    return {
+        "count": count,
+        "first": f"{request.base_url}?cursor=&{query_params}",
+        "last": None,
+        "previous": None,
+        "next": next_url,
+        "results": list(map(query_list_to_dict, rows)),
+    }
+
+
+def active_years(
+    model: db.Base,
+    query_filters_config: Iterable[QueryFilterConfig] = (),
+    measures: Iterable[str] = (),
+    from_year: Optional[int] = None,
+    to_year: Optional[int] = None,
+    start_column: str = "applied_date",
+    end_column: str = "sunset",
+) -> List[dict]:
+    """
+    :param model: A SQLAlchemy model whose rows are active from the year of `start_column`
+           to the year of `end_column`, both included.
+    :param query_filters_config: An iterable of filters to apply to the query (see `search`).
+    :param measures: The columns summed over the active rows of each year.
+    :param from_year: The first year of the results, the first start year of the rows by default.
+    :param to_year: The last year of the results, the last end year of the rows by default.
+           Both are clamped to `ACTIVE_YEARS_RANGE`.
+    :return: The number of active rows and the sums of the measures for each year from `from_year` to `to_year`.
+
+    The series is computed with a single query by sweeping the years: each row adds its measures in its start year
+    and removes them the year after its end, and the query groups these changes by year.
+    The totals of each year are the running sums of the changes. Rows without start or end year are not counted.
+    The query uses the smallest rollup of the model with the filter, start and end columns (see `utils.rollups`).
+    """
+    if from_year is not None and to_year is not None and from_year > to_year:
+        raise BadRequest("from_year must be less than or equal to to_year")
+
+    with instrumentation.phase("compile"):
+        query_filters_config = list(query_filters_config)
+        measures = list(measures)
+        rollup = rollups.find_rollup(
+            model.__tablename__,
+            [
+                *(
+                    column_name
+                    for query_filter_config in query_filters_config
+                    for column_name in get_filter_columns(query_filter_config)
+                ),
+                start_column,
+                end_column,
+            ],
+            ["id-count", *(f"{measure}-sum" for measure in measures)],
+        )
+        if rollup:
+            source = rollup.table.c
+            weights = [
+                source.row_count,
+                *(source[f"{measure}_sum"] for measure in measures),
+            ]
+        else:
+            source = model
+            weights = [literal(1), *(getattr(model, measure) for measure in measures)]
+
+        start = getattr(source, start_column)
+        end = getattr(source, end_column)
+        query_filters = [
+            *(
+                process_query_filters(source, query_filter_config)
+                for query_filter_config in query_filters_config
+            ),
+            start.isnot(None),
+            end.isnot(None),
+        ]
+        names = ["count", *measures]
+        changes = union_all(
+            select(
+                start.label("year"),
+                *(weight.label(name) for weight, name in zip(weights, names)),
+            ).where(*query_filters),
+            select(
+                (end + 1).label("year"),
+                *((-weight).label(name) for weight, name in zip(weights, names)),
+            ).where(*query_filters),
+        ).subquery()
+        query = (
+            model.query.session.query(
+                changes.c.year,
+                func.sum(changes.c["count"]).cast(BigInteger),
+                *(func.sum(changes.c[measure]) for measure in measures),
+            )
+            .group_by(changes.c.year)
+            .order_by(changes.c.year)
+        )
+
+    with instrumentation.phase("fetch"):
+        rows = query.all()
+    if not rows:
+        return []
+
+    (min_year, max_year) = ACTIVE_YEARS_RANGE
+    from_year = max(rows[0][0] if from_year is None else from_year, min_year)
+    # The last change is the end of the last active rows
+    to_year = min(rows[-1][0] - 1 if to_year is None else to_year, max_year)
+
+    def add(totals: list, changes: tuple) -> list:
+        return [total + (change or 0) for total, change in zip(totals, changes)]
+
+    # The changes before `from_year` are only added to the totals of its year
+    totals = [0] * len(names)
+    for (year, *year_changes) in rows:
+        if year >= from_year:
+            break
+        totals = add(totals, year_changes)
+
+    changes_by_year = {row[0]: row[1:] for row in rows}
+    results = []
+    for year in range(from_year, to_year + 1):
+        if year in changes_by_year:
+            totals = add(totals, changes_by_year[year])
+        results.append({"year": year, **dict(zip(names, totals))})
+    return results
@@ -0,0 +1,285 @@
+import hashlib
+import json
+from typing import Any, Callable, Dict, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+SQ_FT_PER_ACRE = 43560
+
+# The column of the nutrient sheets used when a state does not have its own reduction value
+STEPL_COLUMN = "STEPL 4.4"
+
+# The assumption columns stored as JSON objects keyed by state
+STATE_ASSUMPTIONS = (
+    "life_span",
+    "conv",
+    "nitrogen",
+    "phosphorus",
+    "category",
+    "wq_benefits",
+)
+
+# (nutrient assumption, HUC8 rowcrop yield column, state load column, column prefix, baseline key)
+NUTRIENTS = (
+    (
+        "phosphorus",
+        "rowcrop_p_yield_lbs_per_ac",
+        "total_p_load_lbs",
+        "p",
+        "usgs_baseline_p_lbs",
+    ),
+    (
+        "nitrogen",
+        "rowcrop_n_yield_lbs_per_ac",
+        "total_n_load_lbs",
+        "n",
+        "usgs_baseline_n_lbs",
+    ),
+)
+
+DERIVED_COLUMNS = (
+    "sunset",
+    "active_year",
+    "category",
+    "wq_benefits",
+    "area_treated",
+    "ancillary_benefits",
+    "p_reduction_fraction",
+    "n_reduction_fraction",
+    "p_reduction_percentage_statewide",
+    "n_reduction_percentage_statewide",
+    "p_reduction_gom_lbs",
+    "n_reduction_gom_lbs",
+)
+
+
+def _nutrient_yield(value: str) -> float:
+    return float(value if value else 0)
+
+
+class PracticeReductions:
+    """
+    Computes the columns derived from the practice assumptions for a whole DataFrame of practices at once.
+
+    The per-state JSON columns of the assumptions are flattened into `code x state` lookup tables when the
+    object is created, so it can be built once and reused for any number of practice frames.
+    Rows with a practice code of "0" don't have any derived values.
+    """
+
+    def __init__(
+        self,
+        assumptions: pd.DataFrame,
+        states: pd.DataFrame,
+        huc8_meta: pd.DataFrame,
+        baselines: Dict[str, float],
+    ):
+        """
+        :param assumptions: The `assumptions` table indexed by practice code.
+        :param states: The `states` table indexed by state name.
+        :param huc8_meta: The `huc8_meta` table indexed by HUC8 code.
+        :param baselines: The USGS baselines in `data/baselines.json`.
+        """
+        # Keep the first row of duplicated HUC8s so they can be looked up with a unique index
+        huc8_meta = huc8_meta[~huc8_meta.index.duplicated()]
+
+        # A hash of the inputs, to detect when the derived columns of imported practices are out of date
+        self.fingerprint = hashlib.sha256(
+            json.dumps(
+                [
+                    assumptions.to_json(),
+                    states.to_json(),
+                    huc8_meta.to_json(),
+                    baselines,
+                ],
+                sort_keys=True,
+            ).encode()
+        ).hexdigest()
+
+        self.codes = assumptions.index
+        self.tables = {
+            column: self._flatten(assumptions[column]) for column in STATE_ASSUMPTIONS
+        }
+        self.ancillary_benefits = {
+            code: (
+                []
+                if pd.isna(benefits)
+                else [benefit for benefit in benefits if benefits[benefit] == "1"]
+            )
+            for code, benefits in assumptions["ancillary_benefits"].items()
+        }
+        self.states = states
+        self.huc8_meta = huc8_meta
+        self.baselines = baselines
+
+    @staticmethod
+    def _flatten(column: pd.Series) -> pd.DataFrame:
+        """Turns a column of `{state: value}` objects into a table indexed by code with a column per state."""
+        column = column.dropna()
+        return pd.DataFrame.from_records(column.tolist(), index=column.index)
+
+    def _lookup(
+        self,
+        column: str,
+        codes: np.ndarray,
+        keys: np.ndarray,
+        mask: np.ndarray,
+        convert: Callable[[str], Any] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Looks up the `(code, key)` values of an assumption column for the rows selected by `mask`.
+
+        :return: The values (None for rows without a value) and a mask of the rows that have a value,
+                 i.e. the rows whose assumption is not null.
+        """
+        table = self.tables[column]
+        values = np.full(len(codes), None, dtype=object)
+
+        rows = np.where(mask, table.index.get_indexer(codes), -1)
+        found = rows >= 0
+        if not found.any():
+            return values, found
+
+        columns = table.columns.get_indexer(keys[found])
+        if (columns < 0).any():
+            raise KeyError(
+                f"Missing {column} assumptions for {sorted(set(keys[found][columns < 0]))}"
+            )
+
+        # Convert each distinct cell once and broadcast the results to the rows
+        cells, inverse = np.unique(
+            rows[found] * len(table.columns) + columns, return_inverse=True
+        )
+        cell_values = table.to_numpy(dtype=object).ravel()[cells]
+        if pd.isna(cell_values).any():
+            raise KeyError(f"Missing {column} assumptions for some practice states")
+        if convert:
+            cell_values = np.array([convert(value) for value in cell_values])
+        values[found] = cell_values[inverse.ravel()]
+
+        return values, found
+
+    def _require(self, index: pd.Index, keys: np.ndarray, name: str):
+        missing = pd.unique(keys[~pd.Index(keys).isin(index)])
+        if len(missing):
+            raise KeyError(f"Missing {name}: {list(missing)}")
+
+    def compute(self, practices: pd.DataFrame) -> Tuple[pd.DataFrame, Set[str]]:
+        """
+        :param practices: Practices with cleaned column names (see `Database.clean_column_names`).
+        :return: A DataFrame of the derived columns with the same index as `practices`,
+                 and the set of HUC8 codes that don't exist in the HUC8 metadata.
+        """
+        size = len(practices)
+        codes = practices["nrcs_practice_code"].to_numpy(dtype=object)
+        states = practices["state"].to_numpy(dtype=object)
+        huc8s = practices["huc_8"].to_numpy(dtype=object)
+        active = (practices["nrcs_practice_code"] != "0").to_numpy(dtype=bool)
+
+        self._require(self.codes, codes[active], "practice assumptions")
+        self._require(self.states.index, states[active], "states")
+
+        applied_date = practices["applied_date"].astype("Int64")
+        applied_amount = practices["applied_amount"].to_numpy(dtype="float64")
+
+        # Sunset and active year
+        life_span, has_life_span = self._lookup("life_span", codes, states, active, int)
+        life_span = pd.Series(
+            np.where(has_life_span, life_span, 1),
+            index=practices.index,
+            dtype="Int64",
+        )
+        sunset = (applied_date + life_span - 1).where(active)
+        active_year = applied_date.where((applied_date == sunset).fillna(False))
+
+        # Category and water quality benefits
+        category, _ = self._lookup("category", codes, states, active)
+        wq_benefits, _ = self._lookup("wq_benefits", codes, states, active)
+
+        # Area treated
+        is_sq_ft = (practices["practice_units"] == "sq ft").to_numpy(dtype=bool)
+        conv, has_conv = self._lookup("conv", codes, states, active & ~is_sq_ft, float)
+        area_treated = np.full(size, np.nan)
+        area_treated[active & is_sq_ft] = (
+            applied_amount[active & is_sq_ft] / SQ_FT_PER_ACRE
+        )
+        area_treated[has_conv] = applied_amount[has_conv] * conv[has_conv].astype(
+            "float64"
+        )
+
+        # Ancillary benefits
+        ancillary_benefits = (
+            pd.Series(codes, index=practices.index)
+            .map(self.ancillary_benefits)
+            .where(active, None)
+        )
+
+        derived = {
+            "sunset": sunset,
+            "active_year": active_year,
+            "category": category,
+            "wq_benefits": wq_benefits,
+            "area_treated": area_treated,
+            "ancillary_benefits": ancillary_benefits,
+        }
+
+        # Phosphorus and nitrogen reduction (fraction, statewide percentage and lbs at GOM)
+        missing_huc8: Set[str] = set()
+        huc8_rows = self.huc8_meta.index.get_indexer(huc8s)
+        has_huc8 = huc8_rows >= 0
+        state_rows = self.states.index.get_indexer(states[active])
+        for (
+            nutrient,
+            huc8_yield_column,
+            load_column,
+            prefix,
+            baseline_key,
+        ) in NUTRIENTS:
+            state_yield, has_nutrient = self._lookup(
+                nutrient, codes, states, active, _nutrient_yield
+            )
+            state_yield = np.where(has_nutrient, state_yield, 0).astype("float64")
+
+            use_stepl = has_nutrient & (state_yield <= 0)
+            if use_stepl.any():
+                stepl_yield, _ = self._lookup(
+                    nutrient,
+                    codes,
+                    np.full(size, STEPL_COLUMN, dtype=object),
+                    use_stepl,
+                    _nutrient_yield,
+                )
+                state_yield[use_stepl] = stepl_yield[use_stepl]
+
+            missing_huc8.update(huc8s[has_nutrient & ~has_huc8])
+            huc8_yield = np.zeros(size)
+            huc8_yield[has_huc8] = self.huc8_meta[huc8_yield_column].to_numpy(
+                dtype="float64"
+            )[huc8_rows[has_huc8]]
+
+            state_load = np.full(size, np.nan)
+            state_load[active] = self.states[load_column].to_numpy(dtype="float64")[
+                state_rows
+            ]
+            reduction = state_yield * huc8_yield * area_treated
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                fraction = np.where(
+                    has_nutrient, reduction / self.states[load_column].sum(), 0.0
+                )
+                percentage_statewide = np.where(
+                    has_nutrient, reduction / state_load, 0.0
+                )
+            fraction[~active] = np.nan
+            percentage_statewide[~active] = np.nan
+
+            derived[f"{prefix}_reduction_fraction"] = fraction
+            derived[f"{prefix}_reduction_percentage_statewide"] = percentage_statewide
+            derived[f"{prefix}_reduction_gom_lbs"] = (
+                fraction * self.baselines[baseline_key]
+            )
+
+        return (
+            pd.DataFrame(derived, index=practices.index, columns=DERIVED_COLUMNS),
+            missing_huc8,
+        )
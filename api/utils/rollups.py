@@ -0,0 +1,169 @@
+from typing import Iterable, List, Optional
+
+from sqlalchemy import BigInteger, Column, Float, MetaData, Table, Text, func
+from sqlalchemy.sql.elements import ColumnElement, Label
+
+metadata = MetaData()
+
+# The practices columns that can be used as the grain of a rollup
+DIMENSIONS = {
+    "state": Text,
+    "huc_8": Text,
+    "applied_date": BigInteger,
+    "category": Text,
+    "nrcs_practice_code": Text,
+    "sunset": BigInteger,
+}
+
+# The numeric practices columns whose aggregates are stored in the rollups
+MEASURES = (
+    "applied_amount",
+    "funding",
+    "area_treated",
+    "p_reduction_fraction",
+    "n_reduction_fraction",
+    "p_reduction_percentage_statewide",
+    "n_reduction_percentage_statewide",
+    "p_reduction_gom_lbs",
+    "n_reduction_gom_lbs",
+)
+
+# The aggregate functions stored for each measure. `avg` is computed from `sum` and `count`.
+STORED_AGGREGATES = ("sum", "count", "min", "max")
+
+# The rollup columns returned with the states and HUC8s that have practices, by their name in the responses
+SUMMARY_COLUMNS = {
+    "practice_count": "row_count",
+    "total_funding": "funding_sum",
+    "total_area_treated": "area_treated_sum",
+    "total_p_reduction_gom_lbs": "p_reduction_gom_lbs_sum",
+    "total_n_reduction_gom_lbs": "n_reduction_gom_lbs_sum",
+}
+
+
+class Rollup:
+    """
+    A table with the aggregates of the practices grouped by a set of dimensions (the grain of the rollup).
+    Aggregate queries over the practices that only group and filter by the dimensions of a rollup
+    can be answered by aggregating the (much smaller) rollup instead.
+    """
+
+    def __init__(self, name: str, grain: Iterable[str], source: str = "practices"):
+        self.name = name
+        self.grain = tuple(grain)
+        self.source = source
+        self.table = Table(
+            name,
+            metadata,
+            *[Column(dimension, DIMENSIONS[dimension]) for dimension in self.grain],
+            Column("row_count", BigInteger),
+            *[
+                Column(
+                    f"{measure}_{aggregate}",
+                    BigInteger if aggregate == "count" else Float(53),
+                )
+                for measure in MEASURES
+                for aggregate in STORED_AGGREGATES
+            ],
+        )
+
+    def create_statements(self, source_table: str, table_name: str) -> List[str]:
+        """
+        :param source_table: The practices table to aggregate.
+        :param table_name: The name of the table to create.
+        :return: The SQL statements that create and index the rollup table.
+        """
+        grain = ", ".join(self.grain)
+        aggregates = ", ".join(
+            f"{aggregate}({measure}) AS {measure}_{aggregate}"
+            for measure in MEASURES
+            for aggregate in STORED_AGGREGATES
+        )
+        return [
+            f"DROP TABLE IF EXISTS {table_name}",
+            f"CREATE TABLE {table_name} AS SELECT {grain}, count(*) AS row_count, {aggregates} "
+            f"FROM {source_table} GROUP BY {grain}",
+            f"CREATE INDEX ix_{table_name}_{'_'.join(self.grain)} ON {table_name} ({grain})",
+            f"ANALYZE {table_name}",
+        ]
+
+    def covers(
+        self,
+        columns: Iterable[str],
+        aggregates: Iterable[str],
+    ) -> bool:
+        """
+        :param columns: The practices columns that the query groups, filters, partitions or orders by.
+        :param aggregates: The aggregates of the query in the format of `query.search`.
+        :return: Whether the query can be answered with this rollup.
+        """
+        if not set(columns).issubset(self.grain):
+            return False
+        for aggregate in aggregates:
+            (column_name, agg_func) = aggregate.split("-")
+            if column_name == "id" and agg_func == "count":
+                continue
+            if column_name not in MEASURES or agg_func not in (
+                *STORED_AGGREGATES,
+                "avg",
+            ):
+                return False
+        return True
+
+    def aggregate(self, column_name: str, agg_func: str) -> ColumnElement:
+        """:return: The expression computing the aggregate of a practices column from the rollup."""
+        columns = self.table.c
+        if agg_func == "count":
+            count_column = (
+                columns.row_count
+                if column_name == "id"
+                else columns[f"{column_name}_count"]
+            )
+            return func.coalesce(func.sum(count_column), 0).cast(BigInteger)
+        if agg_func == "sum":
+            return func.sum(columns[f"{column_name}_sum"])
+        if agg_func == "avg":
+            return func.sum(columns[f"{column_name}_sum"]) / func.nullif(
+                func.sum(columns[f"{column_name}_count"]), 0
+            )
+        return getattr(func, agg_func)(columns[f"{column_name}_{agg_func}"])
+
+    def summary_columns(self) -> List[Label]:
+        """:return: The `SUMMARY_COLUMNS` of the rollup, labeled by their name in the responses."""
+        return [
+            self.table.c[column_name].label(name)
+            for name, column_name in SUMMARY_COLUMNS.items()
+        ]
+
+
+# Each state and HUC8 with practices, with their totals. They are the availability tables of the states and HUC8s.
+PRACTICES_BY_STATE = Rollup("practices_by_state", ("state",))
+PRACTICES_BY_HUC8 = Rollup("practices_by_huc8", ("huc_8",))
+
+# Ordered from the smallest expected table to the largest
+ROLLUPS = (
+    PRACTICES_BY_STATE,
+    Rollup("practices_by_category", ("category",)),
+    Rollup("practices_by_code", ("nrcs_practice_code",)),
+    PRACTICES_BY_HUC8,
+    Rollup("practices_by_state_year", ("state", "applied_date")),
+    Rollup("practices_by_huc8_year", ("huc_8", "applied_date")),
+    # The sunset and category of a practice depend on its code and state, so this rollup stays small.
+    # It has the lifespans of the practices for `query.active_years`.
+    Rollup(
+        "practices_by_lifespan",
+        ("state", "nrcs_practice_code", "category", "applied_date", "sunset"),
+    ),
+)
+
+
+def find_rollup(
+    source: str, columns: Iterable[str], aggregates: Iterable[str]
+) -> Optional[Rollup]:
+    """:return: The smallest rollup of the `source` table that covers the query (see `Rollup.covers`)."""
+    columns = set(columns)
+    aggregates = list(aggregates)
+    for rollup in ROLLUPS:
+        if rollup.source == source and rollup.covers(columns, aggregates):
+            return rollup
+    return None
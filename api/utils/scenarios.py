@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.exc import SQLAlchemyError
+from utils.reductions import PracticeReductions
+from werkzeug.exceptions import BadRequest
+
+logger = logging.getLogger(__name__)
+
+# The columns of the practices that the derived columns are computed from, by their name in the scenarios
+SCENARIO_COLUMNS = {
+    "huc_8": "huc_8",
+    "state": "state",
+    "practice_code": "nrcs_practice_code",
+    "applied_amount": "applied_amount",
+    "practice_units": "practice_units",
+    "applied_date": "applied_date",
+}
+
+# The derived columns summed over all the practices of a scenario
+TOTAL_COLUMNS = (
+    "area_treated",
+    "p_reduction_fraction",
+    "n_reduction_fraction",
+    "p_reduction_gom_lbs",
+    "n_reduction_gom_lbs",
+)
+
+
+class ScenarioCalculator:
+    """
+    Computes the derived columns of hypothetical practices, e.g. their reductions at the Gulf of Mexico,
+    with the same `PracticeReductions` as the practices import. The assumptions, states and HUC8 metadata
+    are kept in memory, and they are loaded again when the version of the data changes.
+    """
+
+    def __init__(
+        self,
+        get_practice_reductions: Callable[[], PracticeReductions],
+        get_data_version: Callable[[], Tuple[int, Optional[datetime]]],
+        version_ttl: float = 5,
+    ):
+        """:param version_ttl: Seconds that the data version is reused before reading it again."""
+        self.get_practice_reductions = get_practice_reductions
+        self.get_data_version = get_data_version
+        self.version_ttl = version_ttl
+        self.version: Optional[int] = None
+        self.version_read_at = None
+        self.practice_reductions: Optional[PracticeReductions] = None
+        self.lock = threading.Lock()
+
+    def preload(self):
+        """
+        Loads the assumptions if the database has been prepared, e.g. before the app is forked.
+        Otherwise, they are loaded by the first scenario.
+        """
+        try:
+            if self.get_data_version()[0] > 0:
+                self.reductions()
+        except SQLAlchemyError:
+            logger.warning(
+                "Couldn't preload the assumptions of the scenarios", exc_info=True
+            )
+
+    def reductions(self) -> PracticeReductions:
+        with self.lock:
+            now = time.monotonic()
+            if (
+                self.version_read_at is None
+                or now - self.version_read_at > self.version_ttl
+            ):
+                (version, _) = self.get_data_version()
+                self.version_read_at = now
+                if version != self.version or self.practice_reductions is None:
+                    self.practice_reductions = self.get_practice_reductions()
+                    self.version = version
+            return self.practice_reductions
+
+    def evaluate(self, practices: List[dict]) -> dict:
+        """
+        :param practices: The practices of a scenario, with the keys of `SCENARIO_COLUMNS`.
+        :return: The practices with their derived columns, the totals of the `TOTAL_COLUMNS`
+                 and the HUC8s without metadata, whose reductions are 0.
+        """
+        frame = pd.DataFrame.from_records(
+            practices, columns=list(SCENARIO_COLUMNS)
+        ).rename(columns=SCENARIO_COLUMNS)
+        frame["applied_date"] = frame["applied_date"].astype("Int64")
+        frame["applied_amount"] = frame["applied_amount"].astype("float64")
+
+        try:
+            (derived, missing_huc8) = self.reductions().compute(frame)
+        except KeyError as e:
+            raise BadRequest(e.args[0])
+
+        totals = {
+            column: float(np.nansum(derived[column].to_numpy(dtype="float64")))
+            for column in TOTAL_COLUMNS
+        }
+        # Missing values are returned as null
+        derived_records = (
+            derived.astype(object).where(derived.notna(), None).to_dict("records")
+        )
+        return {
+            "version": self.version,
+            "practices": [
+                {**practice, **derived_record}
+                for practice, derived_record in zip(practices, derived_records)
+            ],
+            "totals": totals,
+            "missing_huc8": sorted(missing_huc8),
+        }
@@ -0,0 +1,69 @@
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Iterable, List, Tuple
+
+import orjson
+from flask import Response, stream_with_context
+from geoalchemy2 import Geometry
+from sqlalchemy import Text, func, inspect
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.types import TypeDecorator
+from utils import instrumentation
+
+
+class GeoJSON(TypeDecorator):
+    """The GeoJSON text of a geometry, parsed when it's fetched."""
+
+    impl = Text
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else orjson.loads(value)
+
+
+@lru_cache(maxsize=None)
+def model_columns(model) -> Tuple[ColumnElement, ...]:
+    """
+    :return: The columns selected to serialize the instances of a model, labeled by their attribute name.
+             Geometries are converted to GeoJSON by the database in the same query.
+    """
+    columns = []
+    for column_property in inspect(model).column_attrs:
+        attribute = getattr(model, column_property.key)
+        if isinstance(column_property.columns[0].type, Geometry):
+            columns.append(
+                func.ST_AsGeoJSON(attribute, type_=GeoJSON).label(column_property.key)
+            )
+        else:
+            columns.append(attribute)
+    return tuple(columns)
+
+
+def default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=default)
+
+
+def jsonify(obj: Any) -> Response:
+    """Like `flask.jsonify`, for the results of `utils.query`."""
+    with instrumentation.phase("serialize"):
+        body = dumps(obj) + b"\n"
+    return Response(body, mimetype="application/json")
+
+
+def ndjson(batches: Iterable[List[dict]]) -> Response:
+    """:return: A response that streams the rows of `utils.query.stream` as newline delimited JSON."""
+
+    def generate():
+        for batch in batches:
+            yield b"".join(
+                orjson.dumps(row, default=default, option=orjson.OPT_APPEND_NEWLINE)
+                for row in batch
+            )
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
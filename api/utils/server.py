@@ -0,0 +1,28 @@
+from typing import Callable
+
+from flask import Flask
+from gunicorn.app.base import BaseApplication
+
+
+class GunicornServer(BaseApplication):
+    """Serves a Flask app with gunicorn, configured with a dict of gunicorn settings instead of its command line."""
+
+    def __init__(self, load_app: Callable[[], Flask], options: dict):
+        """:param load_app: Creates the app. It's called once, or once per worker if `preload_app` is false."""
+        self.load_app = load_app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> Flask:
+        return self.load_app()
+
+
+def patch_psycopg(server, worker):
+    """A `post_fork` hook that makes psycopg yield to the other greenlets of a gevent worker while it waits."""
+    from psycogreen.gevent import patch_psycopg as patch
+
+    patch()
@@ -0,0 +1,54 @@
+import json
+from typing import List, Optional, Sequence
+
+import shapely.geometry
+import shapely.wkt
+from sqlalchemy import func
+from sqlalchemy.sql.functions import Function
+from werkzeug.exceptions import BadRequest
+
+SRID = 4326
+
+
+def get_query_geometries(
+    bbox: Optional[Sequence[float]] = None,
+    point: Optional[Sequence[float]] = None,
+    intersects: Optional[str] = None,
+) -> List[Function]:
+    """
+    :param bbox: `[min longitude, min latitude, max longitude, max latitude]`.
+    :param point: `[longitude, latitude]`.
+    :param intersects: A geometry as WKT or GeoJSON.
+    :return: The geometries of the spatial filter parameters of a request, to filter the rows that intersect
+             all of them with `ST_Intersects` (which uses the GiST index of the geometry column).
+    """
+    geometries = []
+
+    if bbox is not None:
+        (min_x, min_y, max_x, max_y) = bbox
+        if min_x > max_x or min_y > max_y:
+            raise BadRequest(
+                "Invalid bbox: the minimum coordinates must be less than the maximum ones"
+            )
+        geometries.append(func.ST_MakeEnvelope(min_x, min_y, max_x, max_y, SRID))
+
+    if point is not None:
+        (x, y) = point
+        geometries.append(func.ST_SetSRID(func.ST_MakePoint(x, y), SRID))
+
+    if intersects is not None:
+        try:
+            if intersects.lstrip().startswith("{"):
+                geometry = shapely.geometry.shape(json.loads(intersects))
+            else:
+                geometry = shapely.wkt.loads(intersects)
+        # The parsing errors depend on the version of shapely
+        except Exception:
+            raise BadRequest(
+                "Invalid intersects geometry: it must be WKT or a GeoJSON geometry"
+            )
+        if not geometry.is_valid:
+            raise BadRequest("Invalid intersects geometry: it is not a valid geometry")
+        geometries.append(func.ST_GeomFromText(geometry.wkt, SRID))
+
+    return geometries
@@ -0,0 +1,214 @@
+"""
+Measures the latency percentiles and throughput of the practices endpoint of a running API
+for mixes of filters, groups, aggregates and partitions of the synthetic fixtures (see `benchmarks.fixtures`).
+The requests of each mix are sent by `--concurrency` threads, and the phases of their `Server-Timing` header
+are reported with their total latency.
+
+The response cache should be disabled on the server (`API_CACHE_SIZE=0`), or the cached responses are measured.
+
+Usage: python -m benchmarks.api_latency --url http://localhost:8000/bmp-api --output ./logs/api_latency.json
+"""
+import http.client
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import click
+import numpy as np
+
+from benchmarks.report import write_report
+
+# The requests of each mix, relative to the base URL of the API
+MIXES = {
+    "filter": (
+        "/practices?state=Iowa",
+        "/practices?huc_8=07080101&huc_8=05120101&applied_date=2010",
+        "/practices?practice_code=340&sunset=2015&limit=100",
+        "/practices?program=EQIP&min_applied_amount=10&max_applied_amount=1000&page=5",
+        "/practices?category=In-Field&ancillary_benefits=Habitat&count=estimate",
+        "/practices?bbox=-92,40,-88,43",
+    ),
+    "group_by": (
+        "/practices?group_by=state&aggregates=id-count&limit=0",
+        "/practices?group_by=huc_8&aggregates=funding-sum&limit=100",
+        "/practices?group_by=state&group_by=nrcs_practice_code&aggregates=area_treated-sum&limit=0",
+        "/practices?state=Illinois&group_by=program&aggregates=funding-sum&aggregates=id-count",
+    ),
+    "aggregate": (
+        "/practices?aggregates=funding-sum&aggregates=area_treated-sum",
+        "/practices?aggregates=p_reduction_gom_lbs-sum&aggregates=n_reduction_gom_lbs-sum&state=Iowa",
+        "/practices?aggregates=applied_amount-avg&practice_code=590",
+    ),
+    "partition": (
+        "/practices?partitions=state&partition_size=5&order_by=-funding&limit=0",
+        "/practices?group_by=state&group_by=nrcs_practice_code&aggregates=funding-sum"
+        "&partitions=state&partition_size=3&order_by=-funding-sum&limit=0",
+        "/practices?huc_8=07080101&partitions=program&partition_size=10&order_by=-applied_amount",
+    ),
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def latency_percentiles(seconds: Iterable[float]) -> Optional[dict]:
+    """:return: The percentiles, mean and maximum of latencies in milliseconds."""
+    milliseconds = np.array(list(seconds)) * 1000
+    if not len(milliseconds):
+        return None
+    return {
+        **{
+            f"p{percentile}": value
+            for percentile, value in zip(
+                PERCENTILES, np.percentile(milliseconds, PERCENTILES)
+            )
+        },
+        "mean": milliseconds.mean(),
+        "max": milliseconds.max(),
+    }
+
+
+def server_timing(header: Optional[str]) -> Dict[str, float]:
+    """:return: The seconds of each phase of a `Server-Timing` header, e.g. `fetch;dur=12.5`."""
+    phases = {}
+    for metric in (header or "").split(","):
+        (name, *parameters) = metric.strip().split(";")
+        for parameter in parameters:
+            if parameter.startswith("dur="):
+                phases[name] = float(parameter.split("=", 1)[1]) / 1000
+    return phases
+
+
+def send(
+    url: str, timeout: float
+) -> Tuple[str, Union[int, str], float, Dict[str, float], bool]:
+    """
+    :return: The URL, status, latency in seconds, server timing and whether the response was cached.
+             The status is the name of the error when the request failed without a response, e.g. a timeout.
+    """
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            (status, headers) = (response.status, response.headers)
+    except urllib.error.HTTPError as e:
+        (status, headers) = (e.code, e.headers)
+    # `URLError`, `TimeoutError` and the socket errors are `OSError`s
+    except (OSError, http.client.HTTPException) as e:
+        (status, headers) = (type(e).__name__, {})
+    return (
+        url,
+        status,
+        time.perf_counter() - start,
+        server_timing(headers.get("Server-Timing")),
+        headers.get("X-Cache") == "HIT",
+    )
+
+
+def run_mix(
+    base_url: str,
+    paths: Tuple[str, ...],
+    requests: int,
+    concurrency: int,
+    timeout: float,
+) -> dict:
+    urls = [base_url + path for path in paths]
+    latencies = defaultdict(list)
+    phases = defaultdict(list)
+    errors = defaultdict(int)
+    cache_hits = 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for (url, status, seconds, timing, cached) in executor.map(
+            lambda url: send(url, timeout), islice(cycle(urls), requests)
+        ):
+            if status != 200:
+                errors[f"{status} {url}"] += 1
+                continue
+            latencies[url].append(seconds)
+            for name, phase_seconds in timing.items():
+                phases[name].append(phase_seconds)
+            cache_hits += cached
+    seconds = time.perf_counter() - start
+
+    return {
+        "requests_per_second": requests / seconds,
+        "errors": dict(errors),
+        "cache_hits": cache_hits,
+        "latency_ms": latency_percentiles(
+            latency for url_latencies in latencies.values() for latency in url_latencies
+        ),
+        "server_timing_ms": {
+            name: latency_percentiles(phase_seconds)
+            for name, phase_seconds in sorted(phases.items())
+        },
+        "by_request": {
+            path: latency_percentiles(latencies[url]) for path, url in zip(paths, urls)
+        },
+    }
+
+
+@click.command()
+@click.option(
+    "--url",
+    type=str,
+    default="http://localhost:8000/bmp-api",
+    help="Base URL of the API",
+)
+@click.option(
+    "--mix",
+    "mixes",
+    type=click.Choice(list(MIXES)),
+    multiple=True,
+    help="Mixes of requests to measure, all of them by default",
+)
+@click.option(
+    "--requests", type=int, default=200, help="Number of requests of each mix"
+)
+@click.option(
+    "--concurrency", type=int, default=4, help="Number of concurrent requests"
+)
+@click.option(
+    "--warmup",
+    type=int,
+    default=1,
+    help="Number of times each request is sent before the measured ones",
+)
+@click.option(
+    "--timeout", type=float, default=60, help="Seconds to wait for each response"
+)
+@click.option("--output", type=str, default=None, help="Path of the JSON report")
+def main(
+    url: str,
+    mixes: Tuple[str, ...],
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    timeout: float,
+    output: str,
+):
+    url = url.rstrip("/")
+    results = {}
+    for name in mixes or MIXES:
+        for path in MIXES[name] * warmup:
+            send(url + path, timeout)
+        results[name] = run_mix(url, MIXES[name], requests, concurrency, timeout)
+
+    write_report(
+        "api_latency",
+        {
+            "url": url,
+            "requests": requests,
+            "concurrency": concurrency,
+            "mixes": results,
+        },
+        output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compares writing a synthetic practices table with `COPY` and with `DataFrame.to_sql` inserts.
+The database is configured with the same environment variables as the API and the extractor.
+
+Usage: python -m benchmarks.bulk_load --rows 100000
+"""
+import json
+import os
+
+import click
+from dotenv import load_dotenv
+
+from api.utils.db import PRACTICES_SQL_DTYPE, Database
+from benchmarks.synthetic import practices_frame
+
+load_dotenv()
+
+TABLE_NAME = "benchmark_practices"
+
+
+@click.command()
+@click.option("--rows", type=int, default=100000, help="Number of practices to write")
+@click.option("--repeat", type=int, default=3, help="Number of runs of each method")
+def main(rows: int, repeat: int):
+    practices = practices_frame(rows)
+
+    results = {}
+    for method, bulk_copy in (("copy", True), ("insert", False)):
+        db = Database(
+            host=os.getenv("DB_HOST", "localhost"),
+            port=os.getenv("DB_PORT", "5432"),
+            user=os.getenv("DB_USER", "postgres"),
+            password=os.getenv("DB_PASSWORD", ""),
+            db_name=os.getenv("DB_NAME", "gltg_bmp"),
+            bulk_copy=bulk_copy,
+        )
+        results[method] = [
+            db.write_table(
+                practices,
+                TABLE_NAME,
+                index_label="id",
+                dtype=PRACTICES_SQL_DTYPE,
+                if_exists="replace",
+            )
+            for _ in range(repeat)
+        ]
+        db.engine.execute(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+        db.shutdown()
+
+    print(
+        json.dumps(
+            {
+                "rows": rows,
+                "rows_per_second": {
+                    method: max(runs) for method, runs in results.items()
+                },
+                "speedup": max(results["copy"]) / max(results["insert"]),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
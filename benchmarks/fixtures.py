@@ -0,0 +1,125 @@
+"""
+Writes synthetic practices workbooks in the layout read by the import (a title row, then the header row,
+the columns A:M and a few formatted empty rows), and a GeoPackage with the HUC8 boundaries of the boundaries
+workbook, which replaces the WBD GeoDatabase for `prepare-db`. The states and assumptions are the ones of `./data`.
+
+Usage: python -m benchmarks.fixtures --rows 100000 --output ./benchmarks/data/100000
+"""
+import json
+import math
+import os
+import time
+from typing import List, Tuple
+
+import click
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill
+
+from api.utils.db import HUC8_LAYER
+from benchmarks.synthetic import huc8_frame, workbook_frame
+
+# The real workbooks have up to a few hundred thousand rows each
+ROWS_PER_WORKBOOK = 250000
+
+# Empty rows with a fill after the practices, like the formatted rows at the end of the real workbooks
+FORMATTED_ROWS = 5
+
+
+def write_workbook(practices: pd.DataFrame, path: str):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Practices")
+    sheet.append(["Synthetic practices"])
+    sheet.append(list(practices.columns))
+    for row in practices.astype(object).itertuples(index=False):
+        sheet.append(
+            [
+                None
+                if isinstance(value, float) and math.isnan(value)
+                else value.item()
+                if isinstance(value, np.generic)
+                else value
+                for value in row
+            ]
+        )
+    fill = PatternFill("solid", fgColor="FFFF00")
+    for _ in range(FORMATTED_ROWS):
+        cells = [WriteOnlyCell(sheet) for _ in practices.columns]
+        for cell in cells:
+            cell.fill = fill
+        sheet.append(cells)
+    workbook.save(path)
+
+
+def write_fixtures(
+    rows: int, output: str, rows_per_workbook: int = ROWS_PER_WORKBOOK, seed: int = 0
+) -> Tuple[List[str], str]:
+    """:return: The paths of the practices workbooks and of the HUC8 GeoPackage."""
+    os.makedirs(output, exist_ok=True)
+
+    huc8_path = os.path.join(output, "huc8.gpkg")
+    huc8_frame(seed).to_file(huc8_path, layer=HUC8_LAYER, driver="GPKG")
+
+    workbook_paths = []
+    for number, start in enumerate(range(0, rows, rows_per_workbook)):
+        path = os.path.join(output, f"practices_{number}.xlsx")
+        write_workbook(
+            workbook_frame(min(rows_per_workbook, rows - start), seed + number), path
+        )
+        workbook_paths.append(path)
+    return workbook_paths, huc8_path
+
+
+def find_fixtures(output: str) -> Tuple[List[str], str]:
+    """:return: The paths of the practices workbooks and of the HUC8 GeoPackage written to a directory."""
+    workbook_paths = sorted(
+        os.path.join(output, name)
+        for name in os.listdir(output)
+        if name.startswith("practices_") and name.endswith(".xlsx")
+    )
+    return workbook_paths, os.path.join(output, "huc8.gpkg")
+
+
+@click.command()
+@click.option(
+    "--rows",
+    type=click.Choice(["10000", "100000", "1000000"]),
+    default="100000",
+    help="Number of practices to write",
+)
+@click.option(
+    "--output",
+    type=str,
+    default=None,
+    help="Directory of the fixtures, ./benchmarks/data/<rows> by default",
+)
+@click.option(
+    "--rows-per-workbook",
+    type=int,
+    default=ROWS_PER_WORKBOOK,
+    help="Maximum number of practices in each workbook",
+)
+@click.option("--seed", type=int, default=0, help="Seed of the random values")
+def main(rows: str, output: str, rows_per_workbook: int, seed: int):
+    output = output or os.path.join("benchmarks", "data", rows)
+    start = time.perf_counter()
+    (workbook_paths, huc8_path) = write_fixtures(
+        int(rows), output, rows_per_workbook, seed
+    )
+    print(
+        json.dumps(
+            {
+                "rows": int(rows),
+                "workbooks": workbook_paths,
+                "huc8": huc8_path,
+                "seconds": time.perf_counter() - start,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measures the throughput of `prepare-db` and of the practices import on synthetic fixtures
+(see `benchmarks.fixtures`), which are written first if they don't exist.
+The database is configured with the same environment variables as the API and the extractor,
+and the tables of the API are replaced.
+
+Usage: python -m benchmarks.importer --rows 100000 --output ./logs/importer.json
+"""
+import json
+import os
+
+import click
+from dotenv import load_dotenv
+
+from api.utils.db import Database
+from api.utils.profiling import LOGS_DIR
+from benchmarks.fixtures import find_fixtures, write_fixtures
+from benchmarks.report import write_report
+
+load_dotenv()
+
+
+def last_import_report() -> dict:
+    """:return: The report of the last import, written by `ImportReport`."""
+    with open(os.path.join(LOGS_DIR, "import_report.json")) as f:
+        return json.load(f)
+
+
+@click.command()
+@click.option(
+    "--rows",
+    type=click.Choice(["10000", "100000", "1000000"]),
+    default="100000",
+    help="Number of practices to import",
+)
+@click.option(
+    "--fixtures",
+    type=str,
+    default=None,
+    help="Directory of the fixtures, ./benchmarks/data/<rows> by default",
+)
+@click.option(
+    "--chunk-size",
+    type=int,
+    default=50000,
+    help="Rows of each chunk of the import, 0 to read each workbook at once",
+)
+@click.option("--workers", type=int, default=1, help="Processes of the import")
+@click.option("--repeat", type=int, default=1, help="Number of imports")
+@click.option(
+    "--skip-prepare",
+    is_flag=True,
+    help="Don't import the states, assumptions and HUC8s, e.g. when they were imported by a previous run",
+)
+@click.option("--output", type=str, default=None, help="Path of the JSON report")
+def main(
+    rows: str,
+    fixtures: str,
+    chunk_size: int,
+    workers: int,
+    repeat: int,
+    skip_prepare: bool,
+    output: str,
+):
+    fixtures = fixtures or os.path.join("benchmarks", "data", rows)
+    if os.path.isdir(fixtures) and find_fixtures(fixtures)[0]:
+        (workbook_paths, huc8_path) = find_fixtures(fixtures)
+    else:
+        (workbook_paths, huc8_path) = write_fixtures(int(rows), fixtures)
+
+    db = Database(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", ""),
+        db_name=os.getenv("DB_NAME", "gltg_bmp"),
+    )
+
+    prepare = None
+    if not skip_prepare:
+        db.prepare(huc8_path)
+        prepare = last_import_report()
+
+    runs = []
+    for _ in range(repeat):
+        db.import_practices(workbook_paths, chunk_size=chunk_size, workers=workers)
+        runs.append(last_import_report())
+    db.shutdown()
+
+    fastest = min(runs, key=lambda run: run["seconds"])
+    write_report(
+        "importer",
+        {
+            "rows": int(rows),
+            "workbooks": len(workbook_paths),
+            "chunk_size": chunk_size,
+            "workers": workers,
+            "prepare": {"seconds": prepare["seconds"], "stages": prepare["stages"]}
+            if prepare
+            else None,
+            "import_practices": {
+                "seconds": [run["seconds"] for run in runs],
+                "rows_per_second": int(rows) / fastest["seconds"],
+                "peak_rss_mb": fastest["peak_rss_mb"],
+                "workers_peak_rss_mb": fastest["workers_peak_rss_mb"],
+                "stages": fastest["stages"],
+            },
+        },
+        output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Compares the query plans and latency of the queries of the API on a synthetic practices table
+without and with the `PRACTICES_INDEXES`.
+The database is configured with the same environment variables as the API and the extractor.
+It fails if a deep page of cursor pagination isn't read with an index range scan.
+
+Usage: python -m benchmarks.practice_indexes --rows 100000
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+import click
+from dotenv import load_dotenv
+from sqlalchemy import MetaData, literal_column, select
+from sqlalchemy.dialects import postgresql
+
+from api.utils.db import PRACTICES_SQL_DTYPE, Database
+from benchmarks.synthetic import practices_frame
+
+# The API modules import each other relative to the api directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "api"))
+
+from handlers.practices import Practice  # noqa: E402
+from utils.query import keyset_filter  # noqa: E402
+
+load_dotenv()
+
+TABLE_NAME = "benchmark_practices"
+
+QUERIES = {
+    "huc_8": f"SELECT * FROM {TABLE_NAME} WHERE huc_8 IN ('5010001', '7080101') LIMIT 20",
+    "state_applied_date": f"SELECT * FROM {TABLE_NAME} WHERE state = 'Iowa' AND applied_date >= 2018 LIMIT 20",
+    "practice_code_sunset": (
+        f"SELECT * FROM {TABLE_NAME} WHERE nrcs_practice_code = '340' AND sunset <= 2005 LIMIT 20"
+    ),
+    "category_program_count": (
+        f"SELECT count(*) FROM {TABLE_NAME} WHERE category = 'Edge-of-Field' AND program = 'CRP'"
+    ),
+    "ancillary_benefits": (
+        f"SELECT * FROM {TABLE_NAME} WHERE ancillary_benefits ?| ARRAY['Habitat', 'Social'] LIMIT 20"
+    ),
+    "group_by_huc_8": f"SELECT huc_8 FROM {TABLE_NAME} GROUP BY huc_8",
+    "group_by_state": f"SELECT state, count(id) FROM {TABLE_NAME} GROUP BY state",
+}
+
+
+def cursor_page_sql(after_id: int) -> str:
+    """:return: The SQL of the page of `/practices?cursor=...` after the practice `after_id`, in the default order."""
+    practices = Practice.__table__.to_metadata(MetaData(), name=TABLE_NAME)
+    query = (
+        select(literal_column("*"))
+        .select_from(practices)
+        .where(keyset_filter([(practices.c.id, False)], [after_id]))
+        .order_by(practices.c.id)
+        .limit(20)
+    )
+    return str(
+        query.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def is_index_range_scan(plan: dict) -> bool:
+    """:return: Whether a plan starts reading an index at a key (`Index Cond`) and doesn't sort or scan the table."""
+    nodes = [plan]
+    for node in nodes:
+        nodes.extend(node.get("Plans", []))
+    return not any(node["Node Type"] in ("Seq Scan", "Sort") for node in nodes) and any(
+        "Index Scan" in node["Node Type"] and "Index Cond" in node for node in nodes
+    )
+
+
+def plan_nodes(plan: dict) -> list:
+    """:return: The node types of a plan and its sub plans, depth first."""
+    return [
+        plan["Node Type"]
+        + (f" using {plan['Index Name']}" if "Index Name" in plan else ""),
+        *[node for sub_plan in plan.get("Plans", []) for node in plan_nodes(sub_plan)],
+    ]
+
+
+def run_queries(db: Database, queries: dict, repeat: int) -> dict:
+    results = {}
+    for name, sql in queries.items():
+        (plan,) = db.engine.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}").first()
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.engine.execute(sql).fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            "plan": plan_nodes(plan[0]["Plan"]),
+            "index_range_scan": is_index_range_scan(plan[0]["Plan"]),
+            "median_ms": statistics.median(latencies),
+        }
+    return results
+
+
+@click.command()
+@click.option("--rows", type=int, default=100000, help="Number of practices to write")
+@click.option("--repeat", type=int, default=5, help="Number of runs of each query")
+def main(rows: int, repeat: int):
+    db = Database(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", ""),
+        db_name=os.getenv("DB_NAME", "gltg_bmp"),
+    )
+    db.write_table(
+        practices_frame(rows),
+        TABLE_NAME,
+        index_label="id",
+        dtype=PRACTICES_SQL_DTYPE,
+        if_exists="replace",
+    )
+    db.engine.execute(f"ANALYZE {TABLE_NAME}")
+
+    queries = {**QUERIES, "cursor_deep_page": cursor_page_sql(int(rows * 0.9))}
+    before = run_queries(db, queries, repeat)
+    db.create_practices_indexes(TABLE_NAME)
+    after = run_queries(db, queries, repeat)
+
+    db.engine.execute(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+    db.shutdown()
+
+    print(
+        json.dumps(
+            {
+                "rows": rows,
+                "queries": {
+                    name: {
+                        "before": before[name],
+                        "after": after[name],
+                        "speedup": before[name]["median_ms"] / after[name]["median_ms"],
+                    }
+                    for name in queries
+                },
+            },
+            indent=2,
+        )
+    )
+    if not after["cursor_deep_page"]["index_range_scan"]:
+        raise click.ClickException(
+            f"The deep cursor page isn't an index range scan: {after['cursor_deep_page']['plan']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
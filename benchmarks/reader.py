@@ -0,0 +1,74 @@
+"""
+Compares reading the practices workbooks of the synthetic fixtures (see `benchmarks.fixtures`) whole with
+`Database.read_practices` and in chunks with `Database.iter_practices`, which is used by the extractor.
+Both readers must return the same practices, e.g. without the formatted empty rows at the end of the workbooks,
+and the benchmark fails if they don't.
+
+Usage: python -m benchmarks.reader --rows 10000 --chunk-size 5000 --output ./logs/reader.json
+"""
+import os
+import time
+
+import click
+import pandas as pd
+
+from api.utils.db import Database
+from benchmarks.fixtures import find_fixtures, write_fixtures
+from benchmarks.report import write_report
+
+
+@click.command()
+@click.option(
+    "--rows",
+    type=click.Choice(["10000", "100000", "1000000"]),
+    default="10000",
+    help="Number of practices to read",
+)
+@click.option(
+    "--fixtures",
+    type=str,
+    default=None,
+    help="Directory of the fixtures, ./benchmarks/data/<rows> by default",
+)
+@click.option(
+    "--chunk-size",
+    type=int,
+    default=5000,
+    help="Rows of each chunk of the streaming reader",
+)
+@click.option("--output", type=str, default=None, help="Path of the JSON report")
+def main(rows: str, fixtures: str, chunk_size: int, output: str):
+    fixtures = fixtures or os.path.join("benchmarks", "data", rows)
+    if os.path.isdir(fixtures) and find_fixtures(fixtures)[0]:
+        (workbook_paths, _) = find_fixtures(fixtures)
+    else:
+        (workbook_paths, _) = write_fixtures(int(rows), fixtures)
+
+    workbooks = {}
+    for path in workbook_paths:
+        start = time.perf_counter()
+        whole = Database.read_practices(path)
+        read_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        streamed = pd.concat(
+            list(Database.iter_practices(path, chunk_size)), ignore_index=True
+        )
+        stream_seconds = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(whole, streamed)
+        workbooks[os.path.basename(path)] = {
+            "rows": len(whole),
+            "read_practices_seconds": read_seconds,
+            "iter_practices_seconds": stream_seconds,
+        }
+
+    write_report(
+        "reader",
+        {"rows": int(rows), "chunk_size": chunk_size, "workbooks": workbooks},
+        output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Writes the reports of the benchmarks, and compares two reports, e.g. of the same benchmark on two commits.
+The numbers of the reports are compared by their path, and the ones that changed by more than
+`--threshold` are printed with their ratio.
+
+Usage: python -m benchmarks.report ./logs/api_latency_main.json ./logs/api_latency_branch.json
+"""
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import click
+
+
+def git_commit() -> Optional[str]:
+    """:return: The commit of the working tree, with a `-dirty` suffix if it has uncommitted changes."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty", "--abbrev=12"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(benchmark: str, report: dict, output: Optional[str] = None):
+    """Prints the report of a benchmark with the commit it ran on, and writes it to `output` if it's set."""
+    report = {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        **report,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+def flatten(value, path: str = "") -> Dict[str, float]:
+    """:return: The numbers of a report by their path, e.g. `mixes.filter.latency_ms.p95`."""
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, (int, float)):
+        return {path: value}
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return {}
+    return {
+        name: number
+        for key, item in items
+        for name, number in flatten(item, f"{path}.{key}" if path else str(key)).items()
+    }
+
+
+@click.command()
+@click.argument("before", type=click.File())
+@click.argument("after", type=click.File())
+@click.option(
+    "--threshold",
+    type=float,
+    default=0.05,
+    help="Minimum relative change of the numbers that are printed",
+)
+def main(before, after, threshold: float):
+    (before, after) = (json.load(before), json.load(after))
+    (before_numbers, after_numbers) = (flatten(before), flatten(after))
+    changes = {}
+    for name in sorted(before_numbers.keys() & after_numbers.keys()):
+        (old, new) = (before_numbers[name], after_numbers[name])
+        if old == new or (old and abs(new - old) / abs(old) < threshold):
+            continue
+        changes[name] = {
+            "before": old,
+            "after": new,
+            "ratio": new / old if old else None,
+        }
+    print(
+        json.dumps(
+            {
+                "before": before.get("commit"),
+                "after": after.get("commit"),
+                "changes": changes,
+                "missing": sorted(before_numbers.keys() - after_numbers.keys()),
+                "added": sorted(after_numbers.keys() - before_numbers.keys()),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
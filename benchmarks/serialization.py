@@ -0,0 +1,81 @@
+"""
+Compares serializing practices with `AlchemyEncoder` (ORM instances with `json`)
+and with `utils.serializers` (rows of the model columns with orjson). It doesn't use the database.
+
+Usage: python -m benchmarks.serialization --rows 100000
+"""
+import json
+import os
+import sys
+import time
+
+import click
+import numpy as np
+
+from benchmarks.synthetic import practices_frame
+
+# The API modules import each other relative to the api directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "api"))
+
+from handlers.practices import Practice  # noqa: E402
+from utils.encoders import AlchemyEncoder  # noqa: E402
+from utils.serializers import dumps, model_columns  # noqa: E402
+
+
+def encoder_json(instances: list) -> bytes:
+    return json.dumps(instances, cls=AlchemyEncoder).encode()
+
+
+def serializer_json(rows: list) -> bytes:
+    keys = [column.key for column in model_columns(Practice)]
+    return dumps([dict(zip(keys, row)) for row in rows])
+
+
+@click.command()
+@click.option(
+    "--rows", type=int, default=100000, help="Number of practices to serialize"
+)
+@click.option("--repeat", type=int, default=3, help="Number of runs of each method")
+def main(rows: int, repeat: int):
+    practices = practices_frame(rows).rename_axis("id").reset_index()
+    practices = practices.astype(object).where(practices.notna(), None)
+    keys = [column.key for column in model_columns(Practice)]
+    records = [
+        {
+            key: value.item() if isinstance(value, np.generic) else value
+            for key, value in record.items()
+        }
+        for record in practices[keys].to_dict("records")
+    ]
+    instances = [Practice(**record) for record in records]
+    result_rows = [tuple(record.values()) for record in records]
+
+    results = {}
+    for method, serialize, data in (
+        ("encoder", encoder_json, instances),
+        ("serializer", serializer_json, result_rows),
+    ):
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            serialize(data)
+            durations.append(time.perf_counter() - start)
+        results[method] = min(durations)
+
+    print(
+        json.dumps(
+            {
+                "rows": rows,
+                "seconds": results,
+                "rows_per_second": {
+                    method: rows / seconds for method, seconds in results.items()
+                },
+                "speedup": results["encoder"] / results["serializer"],
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import math
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import MultiPolygon, box
+
+STATES = ("Illinois", "Indiana", "Iowa", "Minnesota", "Missouri", "Ohio", "Wisconsin")
+PRACTICE_CODES = ("0", "329", "340", "345", "393", "412", "590", "606")
+PROGRAMS = ("EQIP", "CSP", "CRP", "Tillage Transect")
+CATEGORIES = ("In-Field", "Edge-of-Field", "Land-Use-Change")
+ANCILLARY_BENEFITS = ("Habitat", "Soil Health", "Economic", "Social")
+
+# The fixtures of `prepare`. The synthetic workbooks use their states, HUC8s and practice codes.
+ASSUMPTIONS_PATH = "./data/assumptions.xlsx"
+BOUNDARIES_PATH = "./data/boundaries.xlsx"
+
+# The header of the practices workbooks, in the columns A:M read by the import
+WORKBOOK_COLUMNS = (
+    "HUC 8",
+    "HUC 12",
+    "State",
+    "County Code",
+    "County",
+    "NRCS Practice Code",
+    "Practice Name",
+    "Program",
+    "Fund Code",
+    "Applied Amount",
+    "Practice Units",
+    "Applied Date",
+    "Funding",
+)
+
+# The extent of the synthetic HUC8 boundaries, around the Mississippi and Ohio river basins
+HUC8_BOUNDS = (-98.0, 36.0, -80.0, 48.0)
+
+
+def practices_frame(size: int, seed: int = 0) -> pd.DataFrame:
+    """Builds a practices table with the columns of the `practices` table and random values."""
+    rng = np.random.default_rng(seed)
+    applied_date = rng.integers(2000, 2021, size)
+    return pd.DataFrame(
+        {
+            "huc_8": rng.integers(5010001, 8090302, size).astype(str),
+            "huc_12": rng.integers(50100010101, 80903020101, size).astype(str),
+            "state": rng.choice(STATES, size),
+            "county_code": rng.integers(1, 200, size).astype(str),
+            "county": "County",
+            "nrcs_practice_code": rng.choice(PRACTICE_CODES, size),
+            "practice_name": "Practice",
+            "program": rng.choice(PROGRAMS, size),
+            "fund_code": "Fund",
+            "applied_amount": rng.random(size) * 1000,
+            "practice_units": rng.choice(("ac", "ft", "sq ft", "no"), size),
+            "applied_date": applied_date,
+            "funding": rng.random(size) * 10000,
+            "sunset": applied_date + rng.integers(0, 15, size),
+            "active_year": pd.array([None] * size, dtype="Int64"),
+            "category": rng.choice(CATEGORIES, size),
+            "wq_benefits": "TBD",
+            "area_treated": rng.random(size) * 100,
+            "ancillary_benefits": [
+                [
+                    str(benefit)
+                    for benefit in rng.choice(
+                        ANCILLARY_BENEFITS, rng.integers(0, 3), replace=False
+                    )
+                ]
+                for _ in range(size)
+            ],
+            "p_reduction_fraction": rng.random(size) * 1e-6,
+            "n_reduction_fraction": rng.random(size) * 1e-6,
+            "p_reduction_percentage_statewide": rng.random(size) * 1e-5,
+            "n_reduction_percentage_statewide": rng.random(size) * 1e-5,
+            "p_reduction_gom_lbs": rng.random(size) * 100,
+            "n_reduction_gom_lbs": rng.random(size) * 1000,
+        },
+        index=pd.RangeIndex(1, size + 1),
+    )
+
+
+def workbook_frame(size: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds the rows of a practices workbook with random values. The states, HUC8s and practice codes are
+    the ones of the assumptions and boundaries workbooks, so their derived columns are computed like
+    the ones of the real practices.
+    """
+    rng = np.random.default_rng(seed)
+    # The practices with a unit conversion, to compute their treated area
+    codes = pd.read_excel(
+        ASSUMPTIONS_PATH, sheet_name="Practice Conv", dtype="str"
+    ).code
+    practices = pd.read_excel(
+        ASSUMPTIONS_PATH, sheet_name="Practices", dtype="str"
+    ).set_index("code")
+    practices = practices[practices.index.isin(codes)]
+    states = pd.read_excel(BOUNDARIES_PATH, sheet_name="States", dtype="str").state
+    states = [
+        state
+        for state in pd.read_excel(
+            ASSUMPTIONS_PATH, sheet_name="Life Span", nrows=0
+        ).columns
+        if state in set(states)
+    ]
+    huc8 = pd.read_excel(BOUNDARIES_PATH, sheet_name="HUC8", dtype="str").code
+
+    practice = rng.integers(0, len(practices), size)
+    huc_8 = rng.choice(huc8, size)
+    county_code = rng.integers(1, 200, size).astype(str)
+    funding = np.round(rng.lognormal(8, 1.5, size), 2)
+    funding[rng.random(size) < 0.2] = np.nan
+    return pd.DataFrame(
+        {
+            "HUC 8": huc_8,
+            "HUC 12": [
+                f"{code}{number:04d}"
+                for code, number in zip(huc_8, rng.integers(101, 9999, size))
+            ],
+            "State": rng.choice(states, size),
+            "County Code": county_code,
+            "County": np.char.add("County ", county_code),
+            "NRCS Practice Code": practices.index[practice],
+            "Practice Name": practices["name"].fillna("Practice").values[practice],
+            "Program": rng.choice(PROGRAMS, size),
+            "Fund Code": rng.choice(("GENERAL", "CLEAN", "MRBI", "RCPP"), size),
+            "Applied Amount": np.round(rng.lognormal(3, 2, size), 3),
+            "Practice Units": practices["units"].fillna("ac").values[practice],
+            "Applied Date": rng.integers(2000, 2021, size),
+            "Funding": funding,
+        },
+        columns=WORKBOOK_COLUMNS,
+    )
+
+
+def huc8_frame(seed: int = 0) -> gpd.GeoDataFrame:
+    """
+    Builds the HUC8 boundaries of the boundaries workbook, with the columns of the `WBDHU8` layer of the
+    Watershed Boundary Dataset. The boundaries are the cells of a grid over `HUC8_BOUNDS`.
+    """
+    rng = np.random.default_rng(seed)
+    huc8 = pd.read_excel(BOUNDARIES_PATH, sheet_name="HUC8", dtype={"code": "str"})
+    columns = math.ceil(math.sqrt(len(huc8)))
+    rows = math.ceil(len(huc8) / columns)
+    (min_x, min_y, max_x, max_y) = HUC8_BOUNDS
+    (width, height) = ((max_x - min_x) / columns, (max_y - min_y) / rows)
+    return gpd.GeoDataFrame(
+        {
+            "huc8": huc8.code,
+            "name": "Watershed " + huc8.code,
+            "areaacres": huc8.area_ac,
+            "states": rng.choice(STATES, len(huc8)),
+            "geometry": [
+                MultiPolygon(
+                    [
+                        box(
+                            min_x + (i % columns) * width,
+                            min_y + (i // columns) * height,
+                            min_x + (i % columns + 1) * width,
+                            min_y + (i // columns + 1) * height,
+                        )
+                    ]
+                )
+                for i in range(len(huc8))
+            ],
+        },
+        crs="EPSG:4326",
+    )
@@ -6,6 +6,7 @@ from typing import List
 from dotenv import load_dotenv
 from pyclowder.extractors import SimpleExtractor
 
+from api.utils.cli import is_true
 from api.utils.db import Database
 
 load_dotenv()
@@ -25,7 +26,15 @@ class PracticesExtractor(SimpleExtractor):
             "db_name": os.getenv("DB_NAME"),
             "user": os.getenv("DB_USER"),
             "password": os.getenv("DB_PASSWORD"),
+            # Whether to profile the imports with cProfile, in addition to the stage timings in logs/import_report.json
+            "profile_imports": is_true(os.getenv("PRACTICES_PROFILE", "False")),
         }
+        # Number of rows to stream from the practice workbooks at a time. 0 loads each workbook at once.
+        self.chunk_size = int(os.getenv("PRACTICES_CHUNK_SIZE", "50000"))
+        # Number of processes that read the practice workbooks of a dataset in parallel
+        self.workers = int(os.getenv("PRACTICES_WORKERS", "1"))
+        # Whether to only import the workbooks that changed since the last run
+        self.incremental = is_true(os.getenv("PRACTICES_INCREMENTAL", "True"))
 
     def process_dataset(self, input_files: List[str]):
         practice_files = []
@@ -38,7 +47,12 @@ class PracticesExtractor(SimpleExtractor):
             return {}
 
         db = Database(**self.database)
-        db.import_practices(practice_files)
+        db.import_practices(
+            practice_files,
+            chunk_size=self.chunk_size,
+            workers=self.workers,
+            incremental=self.incremental,
+        )
         return {
             "metadata": {
                 "last_update": str(datetime.datetime.now()),